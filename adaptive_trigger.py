@@ -0,0 +1,161 @@
+"""
+adaptive_trigger.py v1.0.1
+
+This module provides an APScheduler trigger that learns when the channels publish from the stored metadata.
+It polls densely in the hours new videos usually appear and sparsely otherwise, and falls back to the fixed
+morning and evening runs until enough publish times are known.
+"""
+
+import logging
+from collections import Counter
+from datetime import datetime, time, timedelta
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+from apscheduler.triggers.base import BaseTrigger
+from apscheduler.util import localize, normalize
+
+logger = logging.getLogger('adaptive_trigger')
+
+DENSE_COVERAGE = 0.8  # Share of the publish times the dense hours must cover
+AVAILABILITY_LAG_HOURS = 1  # Hours after a publish hour that are polled densely too, for late or slow uploads
+
+def publish_times(metadata_records: Iterable[dict]) -> List[datetime]:
+    """Collect the local publish times of stored videos.
+
+    'published_at' is used when it has a time of day; a date alone says nothing about the hour, so
+    'downloaded_at' is used instead.
+
+    Args:
+    - metadata_records (Iterable[dict]): The stored metadata records.
+
+    Returns:
+    - List[datetime]: Naive local datetimes, one per video with a usable time.
+    """
+    times = []
+    for record in metadata_records:
+        published = _parse_time(record.get('published_at'))
+        if published is not None and (published.tzinfo is not None or published.time() != datetime.min.time()):
+            times.append(published.astimezone().replace(tzinfo=None) if published.tzinfo else published)
+            continue
+        downloaded = _parse_time(record.get('downloaded_at'))
+        if downloaded is not None:
+            times.append(downloaded.replace(tzinfo=None))
+    return times
+
+def _parse_time(value) -> Optional[datetime]:
+    """Parse an ISO 8601 timestamp such as '2023-10-16T04:00:12Z', or return None."""
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+class AdaptiveTrigger(BaseTrigger):
+    def __init__(self, load_samples: Callable[[], List[datetime]], dense_interval: timedelta, sparse_interval: timedelta,
+                 min_samples: int, fallback_times: List[Tuple[int, int]]) -> None:
+        """Initialize the trigger.
+
+        Args:
+        - load_samples (Callable[[], List[datetime]]): Returns the known local publish times. Called again after each run,
+          so new downloads refine the schedule.
+        - dense_interval (timedelta): Time between polls in the expected publish hours.
+        - sparse_interval (timedelta): Longest time between polls outside them.
+        - min_samples (int): Publish times needed before the schedule is learned; fewer use fallback_times.
+        - fallback_times (List[Tuple[int, int]]): The fixed (hour, minute) runs of each day.
+
+        Returns:
+        - None
+        """
+        self.load_samples = load_samples
+        self.dense_interval = dense_interval
+        self.sparse_interval = sparse_interval
+        self.min_samples = min_samples
+        self.fallback_times = sorted(fallback_times)
+        self.dense_hours: Optional[Set[Tuple[int, int]]] = None  # (weekday, hour) pairs, None while falling back
+
+    def learn(self) -> None:
+        """Rebuild the dense hours from the current publish times."""
+        samples = self.load_samples()
+        if len(samples) < self.min_samples:
+            if self.dense_hours is not None:
+                logger.info(f"Only {len(samples)} publish time(s) known. Using the fixed schedule.")
+            self.dense_hours = None
+            return
+
+        # Hours of the day covering most publish times, each followed by its availability lag
+        hour_counts = Counter(sample.hour for sample in samples)
+        publish_hours, covered = [], 0
+        for hour, count in hour_counts.most_common():
+            publish_hours.append(hour)
+            covered += count
+            if covered >= DENSE_COVERAGE * len(samples):
+                break
+        hours = {(hour + lag) % 24 for hour in publish_hours for lag in range(AVAILABILITY_LAG_HOURS + 1)}
+
+        # Weekdays the channels publish on; others are only polled sparsely
+        weekday_counts = Counter(sample.weekday() for sample in samples)
+        busiest = max(weekday_counts.values())
+        weekdays = {weekday for weekday, count in weekday_counts.items() if count >= 0.1 * busiest}
+
+        self.dense_hours = {(weekday, hour) for weekday in weekdays for hour in hours}
+        logger.info(f"Learned from {len(samples)} publish time(s): polling densely at hours {sorted(hours)} "
+                    f"on weekdays {sorted(weekdays)}.")
+
+    def get_next_fire_time(self, previous_fire_time: Optional[datetime], now: datetime) -> datetime:
+        """Return the next poll time.
+
+        Args:
+        - previous_fire_time (datetime): The previous poll time, or None before the first poll.
+        - now (datetime): The current time.
+
+        Returns:
+        - datetime: The next poll time, in the timezone of now.
+        """
+        self.learn()
+        if self.dense_hours is None:
+            return self._next_fallback_time(now)
+
+        base = previous_fire_time or now
+        next_time = self._next_after(base)
+        if next_time < now:
+            next_time = self._next_after(now)  # Runs were missed, e.g. while the machine slept
+        return next_time
+
+    def _is_dense(self, moment: datetime) -> bool:
+        return (moment.weekday(), moment.hour) in self.dense_hours
+
+    def _next_after(self, moment: datetime) -> datetime:
+        """Return the poll following a poll at moment: dense_interval later inside a dense hour, otherwise
+        sparse_interval later or at the start of the next dense hour, whichever comes first."""
+        if self._is_dense(moment):
+            return _normalize(moment + self.dense_interval)
+        limit = _normalize(moment + self.sparse_interval)
+        hour_start = _normalize(moment.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1))
+        while hour_start < limit:
+            if self._is_dense(hour_start):
+                return hour_start
+            hour_start = _normalize(hour_start + timedelta(hours=1))
+        return limit
+
+    def _next_fallback_time(self, now: datetime) -> datetime:
+        """Return the next of the fixed daily runs."""
+        for day in range(2):
+            for hour, minute in self.fallback_times:
+                # Built as a wall-clock time and localized, so it keeps its hour on the days DST changes
+                run_time = localize(datetime.combine(now.date() + timedelta(days=day), time(hour, minute)), now.tzinfo)
+                if run_time > now:
+                    return run_time
+        return _normalize(now + timedelta(days=1))  # Only reached without fallback times
+
+    def __str__(self) -> str:
+        return 'adaptive[fixed]' if self.dense_hours is None else f'adaptive[{len(self.dense_hours)} dense hours]'
+
+def _normalize(moment: datetime) -> datetime:
+    """Correct the UTC offset of a time computed by adding a timedelta, which keeps the offset it started from
+    even when the sum lies on the other side of a DST change."""
+    if moment.tzinfo is None:
+        return moment
+    if hasattr(moment.tzinfo, 'normalize'):  # pytz
+        return moment.tzinfo.normalize(moment)
+    return normalize(moment)
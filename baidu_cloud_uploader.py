@@ -1,4 +1,4 @@
-# baidu_cloud_uploader.py v1.3.4
+# baidu_cloud_uploader.py v1.9.4
 """
 Module for uploading files to Baidu Netdisk using the Baidu Cloud API,
 handling tasks such as pre-creating upload tasks, uploading file slices,
@@ -8,40 +8,59 @@ and merging slices to complete the upload.
 import os
 import sys
 import json
-import hashlib
+import mmap
+import time
+import random
 import requests
 import logging
 import urllib3
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Set, Union
 from tqdm import tqdm
-from dotenv import load_dotenv
+from config_loader import get_config
+from hash_cache import BAIDU_BLOCK_SIZE, HashCache
+from upload_journal import UploadJournal
+from upload_index import UploadIndex
 from utils import setup_logging
+from metrics import metrics
 
 class BaiduCloudUploader:
-    def __init__(self, file_path=None, config_path: str = './config.env') -> None:
+    def __init__(self, file_path=None, config_path: str = './config.env', config=None) -> None:
     
         """
         Initializes the uploader with access token and app name.
         
         Args:
         - config_path : str : Path to the configuration file (default is './config.env').
+        - config : Mapping : (Optional) The configuration, instead of the shared configuration of config_path.
         """
-        # Load environment variables from the config.env file
-        load_dotenv(dotenv_path=config_path)
+        # Load configuration values from the config.env file
+        self.config = config if config is not None else get_config(config_path)
         setup_logging()
         self.logger = logging.getLogger('baidu_cloud_uploader')
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
         
-        self.access_token = os.getenv('BAIDU_ACCESS_TOKEN')
-        self.app_name = os.getenv('BAIDU_APP_NAME')
+        self.access_token = self.config['BAIDU_ACCESS_TOKEN']
+        self.app_name = self.config['BAIDU_APP_NAME']
+        self.api_base_url = self.config['BAIDU_API_BASE_URL'].rstrip('/')
+        self.pcs_base_url = self.config['BAIDU_PCS_BASE_URL'].rstrip('/')
+        self.upload_workers = max(1, self.config['BAIDU_UPLOAD_WORKERS'])
+        self.max_slice_retries = self.config['BAIDU_UPLOAD_RETRIES']
+        self.hash_cache = HashCache(self.config['STATE_DB_FILE'])
+        self.journal = UploadJournal(self.config['STATE_DB_FILE'], self.config['UPLOAD_JOURNAL_TTL'])
+        self.journal.expire_stale()
+        self.upload_index = UploadIndex(self.config['STATE_DB_FILE'])
+
+        # One pooled session for all slice uploads, sized so every worker keeps its connection alive.
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.upload_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)  # Local stand-ins of the API, e.g. in the benchmarks
         
         if not self.access_token or not self.app_name:
             self._log_error('ACCESS_TOKEN or APP_NAME is missing in the configuration file.')
             raise ValueError("ACCESS_TOKEN or APP_NAME is missing in the configuration file.")
-        
-        if not file_path:
-            self._log_info("Usage: python baidu_cloud_uploader.py <FILE_PATH>")  
-            print("Usage: python baidu_cloud_uploader.py <FILE_PATH>")
-            sys.exit(1)
 
     def _log_info(self, message: str) -> None:
         """
@@ -63,6 +82,18 @@ class BaiduCloudUploader:
         self.logger.error(message)
         # print(f"ERROR: {message}")
 
+    def remote_path(self, file_path: str) -> str:
+        """
+        Return the Baidu Netdisk path a local file is uploaded to.
+
+        Args:
+        - file_path : str : Path to the local file.
+
+        Returns:
+        - str : The remote path inside the app directory.
+        """
+        return f"/apps/{self.app_name}/{os.path.basename(file_path)}"
+
     def send_request(self, url: str, method: str, headers: dict = None, params: dict = None, data: dict = None, files: dict = None) -> dict:
         """
         Send an HTTP request and return the response.
@@ -97,16 +128,17 @@ class BaiduCloudUploader:
         - dict : Response from the server, assumed to be in JSON format.
         """
         print("Precreating file...")
-        url = "https://pan.baidu.com/rest/2.0/xpan/file?method=precreate"
+        url = f"{self.api_base_url}/rest/2.0/xpan/file?method=precreate"
         headers = {"User-Agent": "pan.baidu.com"}
         params = {
             "access_token": self.access_token,
         }
         data = {
-            "path": f"/apps/{self.app_name}/{os.path.basename(file_path)}",
+            "path": self.remote_path(file_path),
             "size": file_size,
             "isdir": 0,
             "autoinit": 1,
+            "rtype": 3,  # Overwrite on a name clash, as in create_file
             "block_list": json.dumps(block_list)
         }
 
@@ -115,7 +147,7 @@ class BaiduCloudUploader:
         return response.json()  # Assuming the response is already in JSON format
 
 
-    def upload_slice(self, file_path, upload_id, partseq, block_size):
+    def upload_slice(self, file_path, upload_id, partseq, block_size, file_slice: Optional[Union[bytes, memoryview]] = None):
         """
         Upload a single slice of the file.
 
@@ -124,19 +156,21 @@ class BaiduCloudUploader:
         - upload_id : str : Upload ID received from the precreate step.
         - partseq : int : Sequence number of the part being uploaded.
         - block_size : int : Size of each slice.
+        - file_slice : bytes or memoryview : (Optional) The slice data; read from the file when omitted.
 
         Returns:
         - dict : Response from the server.
         """
-        url = f"https://d.pcs.baidu.com/rest/2.0/pcs/superfile2?method=upload&access_token={self.access_token}"
+        url = f"{self.pcs_base_url}/rest/2.0/pcs/superfile2?method=upload&access_token={self.access_token}"
         
-        with open(file_path, "rb") as f:
-            f.seek(partseq * block_size)     # Seek to the start of the slice
-            file_slice = f.read(block_size)  # Read the slice from the file
+        if file_slice is None:
+            with open(file_path, "rb") as f:
+                f.seek(partseq * block_size)     # Seek to the start of the slice
+                file_slice = f.read(block_size)  # Read the slice from the file
 
         params = {
             "type": "tmpfile",
-            "path": f"/apps/{self.app_name}/{os.path.basename(file_path)}",
+            "path": self.remote_path(file_path),
             "uploadid": upload_id,
             "partseq": partseq
         }
@@ -145,7 +179,9 @@ class BaiduCloudUploader:
         }
 
         self.logger.info(f"Uploading slice {partseq} for file {file_path}")
-        response = requests.post(url, params=params, files=files)
+        with metrics.timer('upload_slice_seconds'):
+            response = self.session.post(url, params=params, files=files)
+        metrics.inc('uploaded_bytes_total', len(file_slice))
         self.logger.info(f"Received response with status code: {response.status_code} for slice {partseq}")
         
         return response.json()
@@ -164,21 +200,22 @@ class BaiduCloudUploader:
         - dict : Response from the server.
         """
         print("Creating file...")
-        url = "https://pan.baidu.com/rest/2.0/xpan/file?method=create"
+        url = f"{self.api_base_url}/rest/2.0/xpan/file?method=create"
         headers = {"User-Agent": "pan.baidu.com"}
         params = {
             "access_token": self.access_token,
         }
         data = {
-            "path": f"/apps/{self.app_name}/{os.path.basename(file_path)}",
+            "path": self.remote_path(file_path),
             "size": file_size,
             "isdir": 0,
             "uploadid": upload_id,
+            "rtype": 3,  # Overwrite instead of renaming, so the file lands at the path the upload index records
             "block_list": json.dumps(block_list)
         }
 
         self.logger.info(f"Sending POST request to: {url}")
-        response = requests.post(url, headers=headers, params=params, data=data)
+        response = self.session.post(url, headers=headers, params=params, data=data)
         response_json = response.json()
 
         if response_json.get('errno', -1) == 0:
@@ -186,30 +223,135 @@ class BaiduCloudUploader:
         else:
             print(f"File creation failed. Full response: {response_json}")
 
+        return response_json
+
+    def copy_file(self, source_path: str, file_path: str) -> dict:
+        """
+        Copy a file that already exists on Baidu Netdisk to the remote path of a local file, on the server side.
+
+        Args:
+        - source_path : str : Remote path of the existing file.
+        - file_path : str : Path to the local file whose remote path is the destination.
+
+        Returns:
+        - dict : Response from the server.
+        """
+        destination = self.remote_path(file_path)
+        print(f"Copying {source_path} to {destination} on the server...")
+        url = f"{self.api_base_url}/rest/2.0/xpan/file?method=filemanager&opera=copy"
+        headers = {"User-Agent": "pan.baidu.com"}
+        params = {
+            "access_token": self.access_token,
+        }
+        data = {
+            "async": 0,
+            "filelist": json.dumps([{
+                "path": source_path,
+                "dest": os.path.dirname(destination),
+                "newname": os.path.basename(destination),
+                "ondup": "overwrite",
+            }])
+        }
+
+        self.logger.info(f"Sending POST request to: {url}")
+        response = self.session.post(url, headers=headers, params=params, data=data)
         return response.json()
 
-    def upload_slices(self, file_path, upload_id, total_slices, block_size):
+    def upload_slices(self, file_path, upload_id, total_slices, block_size, block_list: Optional[List[str]] = None,
+                      completed: Optional[Set[int]] = None) -> Set[int]:
         """
-        Upload slices of the file with a progress bar.
+        Upload slices of the file concurrently with a progress bar, retrying failed slices with backoff.
+
+        Slices are taken from a memory-mapped view of the file rather than read into buffers of their own. requests
+        still copies each slice into an in-memory multipart body, so up to one slice per upload worker is held in memory.
 
         Args:
         - file_path : str : Path to the file being uploaded.
         - upload_id : str : Upload ID received from the precreate step.
         - total_slices : int : Total number of slices.
         - block_size : int : Size of each slice.
+        - block_list : list : (Optional) MD5 hashes of the slices, checked against the MD5 returned by the server.
+        - completed : set : (Optional) Partseqs already uploaded by an earlier, interrupted attempt.
+
+        Returns:
+        - Set[int] : The partseqs that still failed after BAIDU_UPLOAD_RETRIES retries; empty on success.
+        """
+        completed = completed or set()
+        pending = set(range(total_slices)) - completed
+        print(f"Uploading {len(pending)} of {total_slices} slices with {self.upload_workers} worker(s). Please be patient.")
+
+        with self._map_file(file_path) as file_view, \
+                tqdm(total=total_slices, initial=len(completed), unit="slice", desc="Uploading slices",
+                     ncols=100, position=0, leave=True) as pbar:
+
+            def upload_one(partseq: int) -> bool:
+                with file_view[partseq * block_size:(partseq + 1) * block_size] as file_slice:
+                    response = self.upload_slice(file_path, upload_id, partseq, block_size, file_slice)
+                expected_md5 = block_list[partseq] if block_list else None
+                return self._slice_succeeded(response, expected_md5)
+
+            for attempt in range(self.max_slice_retries + 1):
+                if attempt:
+                    delay = 2 ** attempt + random.uniform(0, 1)  # Exponential backoff with randomness
+                    self._log_info(f"Retrying {len(pending)} failed slice(s) in {delay:.1f}s ({attempt}/{self.max_slice_retries})...")
+                    metrics.inc('upload_slice_retries_total', len(pending))
+                    time.sleep(delay)
+
+                with ThreadPoolExecutor(max_workers=self.upload_workers, thread_name_prefix='slice-upload') as executor:
+                    futures = {executor.submit(upload_one, partseq): partseq for partseq in sorted(pending)}
+                    for future in as_completed(futures):
+                        partseq = futures[future]
+                        try:
+                            succeeded = future.result()
+                        except Exception as e:
+                            self._log_error(f"Error uploading slice {partseq + 1}/{total_slices}: {e}")
+                            continue
+                        if succeeded:
+                            pending.discard(partseq)
+                            self.journal.mark_done(file_path, partseq)
+                            pbar.update(1)
+                        else:
+                            self._log_error(f"Slice {partseq + 1}/{total_slices} was rejected by the server.")
+
+                if not pending:
+                    break
+
+        return pending
+
+    def _slice_succeeded(self, response: dict, expected_md5: Optional[str]) -> bool:
+        """
+        Check a superfile2 upload response.
+
+        Args:
+        - response : dict : Response from the server.
+        - expected_md5 : str : (Optional) MD5 the slice should have.
+
+        Returns:
+        - bool : True if the server accepted the slice and, when given, reported the expected MD5.
+        """
+        if response.get('error_code') or response.get('errno') or 'md5' not in response:
+            return False
+        return expected_md5 is None or response['md5'] == expected_md5
+
+    @contextmanager
+    def _map_file(self, file_path) -> Iterator[memoryview]:
+        """
+        Map a file read-only into memory.
 
-        No explicit return value.
+        Args:
+        - file_path : str : Path to the file.
+
+        Returns:
+        - Iterator[memoryview] : A view of the file contents, released when the context exits.
         """
-        print(f"Uploading {total_slices} slices. Please be patient.")
-        with tqdm(total=total_slices, unit="slice", desc="Uploading slices", ncols=100, position=0, leave=True) as pbar:
-            for i in range(total_slices):
-                try:
-                    upload_response = self.upload_slice(file_path, upload_id, i, block_size)
-                    pbar.update(1)
-                except Exception as e:
-                    self._log_error(f"Error uploading slice {i+1}/{total_slices}: {e}")
-
-    def upload_file(self, file_path, block_size=4 * 1024 * 1024):
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                yield memoryview(b"")  # Empty files cannot be memory-mapped
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                yield view
+
+    def upload_file(self, file_path, block_size=BAIDU_BLOCK_SIZE):
         """
         Handle the entire file upload process.
 
@@ -223,28 +365,56 @@ class BaiduCloudUploader:
         """
         file_size = os.path.getsize(file_path)
 
-        # Calculate MD5 for each block
-        block_list = []
-        with open(file_path, "rb") as f:
-            while True:
-                block = f.read(block_size)
-                if not block:
-                    break
-                md5_hash = hashlib.md5(block).hexdigest()
-                block_list.append(md5_hash)
-
-        # Precreate
-        precreate_response = self.precreate_file(file_path, file_size, block_list)
-        upload_id = precreate_response['uploadid']
-        print("Precreate successful!")
+        # MD5 for each block, usually computed by the downloader while finalizing the file
+        block_list, content_md5 = self.hash_cache.get_or_compute(file_path, block_size)
+
+        # Skip content that is already on the server, or copy it there instead of uploading it again
+        remote_path = self.remote_path(file_path)
+        known_path = self.upload_index.lookup(block_list, content_md5, file_size, preferred_path=remote_path)
+        if known_path == remote_path:
+            self._log_info(f"{file_path} is already uploaded to {remote_path}. Skipping upload.")
+            print("File already uploaded, skipping.")
+            return {"errno": 0, "path": remote_path, "skipped": True}
+        if known_path:
+            copy_response = self.copy_file(known_path, file_path)
+            if copy_response.get('errno', -1) == 0:
+                self._log_info(f"Copied identical content from {known_path} to {remote_path}.")
+                self.upload_index.record(block_list, content_md5, file_size, remote_path)
+                return copy_response
+            self._log_error(f"Server-side copy from {known_path} failed: {copy_response}. Uploading instead.")
+            self.upload_index.forget(known_path)
+
+        # Resume an interrupted upload of the same content, or precreate a new one
+        resumed = self.journal.find(file_path, self.remote_path(file_path), block_size, block_list)
+        if resumed:
+            upload_id, completed = resumed
+            self._log_info(f"Resuming upload of {file_path}: {len(completed)}/{len(block_list)} slices already uploaded.")
+        else:
+            precreate_response = self.precreate_file(file_path, file_size, block_list)
+            upload_id = precreate_response['uploadid']
+            completed = set()
+            self.journal.start(file_path, self.remote_path(file_path), upload_id, block_size, block_list)
+            print("Precreate successful!")
 
         total_slices = len(block_list)  # Calculate the total number of slices
         
-        # Upload each slice with progress bar
-        self.upload_slices(file_path, upload_id, total_slices, block_size)
+        # Upload the slices with progress bar; merging is only allowed once every slice is on the server
+        failed_slices = self.upload_slices(file_path, upload_id, total_slices, block_size, block_list, completed)
+        if failed_slices:
+            if resumed and len(failed_slices) == total_slices - len(completed):
+                # Not a single slice was accepted, most likely because the server dropped the upload ID.
+                self._log_error(f"Discarding the upload journal of {file_path}; the next attempt starts over.")
+                self.journal.finish(file_path)
+            error_message = f"Upload of {file_path} incomplete, slices {sorted(failed_slices)} failed. File not created."
+            self._log_error(error_message)
+            raise RuntimeError(error_message)
 
         # Create file
         create_response = self.create_file(file_path, upload_id, file_size, block_list)
+        if create_response.get('errno', -1) == 0:
+            self.journal.finish(file_path)
+            # Record the path the server reports, in case it still stored the file under another name
+            self.upload_index.record(block_list, content_md5, file_size, create_response.get('path') or remote_path)
         
         return create_response
 
@@ -259,7 +429,9 @@ if __name__ == "__main__":
     Returns:
     - None
     """
-    file_path_to_upload = sys.argv[1] if len(sys.argv) == 2 else None
+    if len(sys.argv) != 2:
+        print("Usage: python baidu_cloud_uploader.py <FILE_PATH>")
+        sys.exit(1)
+    file_path_to_upload = sys.argv[1]
     uploader = BaiduCloudUploader(file_path=file_path_to_upload)
-    if file_path_to_upload:
-        uploader.upload_file(file_path_to_upload)
+    uploader.upload_file(file_path_to_upload)
@@ -0,0 +1,263 @@
+"""
+run_benchmarks.py v1.2.1
+
+This script benchmarks the downloader end to end without touching YouTube, Baidu Netdisk or Gmail. For each batch
+size it starts the local stand-ins of standins.py, writes a config.env pointing at them into a scratch directory,
+and runs video_downloader.main or scheduler.job there in a fresh interpreter. It reports videos per minute,
+bytes per second, the latency of each pipeline stage and the peak RSS of the run.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 1,10 --entry job --set MAX_CONCURRENT_DOWNLOADS=4 --json results.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import functools
+import statistics
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIRECTORY = os.path.dirname(BENCHMARKS_DIRECTORY)
+
+# Settings of every run, before the stand-in addresses and --set overrides are applied
+BASE_CONFIG = {
+    'DISCOVERY_BACKEND': 'page',
+    'PAGE_CACHE_TTL': '0',
+    'MAX_CONCURRENT_UPLOADS': '1',
+    'BAIDU_UPLOAD_RETRIES': '0',
+    'MAX_DOWNLOAD_RETRIES': '1',
+    'DEFAULT_METADATA_EXTRACTOR': 'yt_dlp',
+}
+
+STAGES = ('discover', 'extract', 'download', 'upload', 'notify')
+
+def parse_arguments() -> argparse.Namespace:
+    """Parse command-line arguments.
+
+    Args:
+    - None
+
+    Returns:
+    - argparse.Namespace: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the downloader end to end against local stand-ins.")
+    parser.add_argument('--sizes', default='1,10,100', help="Comma-separated numbers of videos per run.")
+    parser.add_argument('--entry', choices=('main', 'job', 'both'), default='both',
+                        help="Run video_downloader.main, scheduler.job (download and notify) or both.")
+    parser.add_argument('--videos-per-channel', type=int, default=10, help="Videos listed on each stand-in channel.")
+    parser.add_argument('--video-size-kb', type=int, default=1024, help="Size of each synthetic video in KiB.")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Delay added to every stand-in HTTP response.")
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE',
+                        help="Override a configuration value for every run; may be repeated.")
+    parser.add_argument('--json', metavar='PATH', help="Also write the results as JSON to PATH.")
+    parser.add_argument('--keep', action='store_true', help="Keep the scratch directories for inspection.")
+    parser.add_argument('--run-one', metavar='RESULT_PATH', help=argparse.SUPPRESS)  # Internal: run in this process
+    return parser.parse_args()
+
+def write_config(path: str, values: Dict[str, str]) -> None:
+    """Write configuration values as a config.env file."""
+    with open(path, 'w', encoding='utf-8') as file:
+        for key, value in values.items():
+            file.write(f'{key}="{value}"\n')
+
+def run_size(entry: str, size: int, args: argparse.Namespace, overrides: Dict[str, str]) -> dict:
+    """Benchmark one batch size in a fresh interpreter, with the stand-ins running in this process.
+
+    Args:
+    - entry (str): 'main' or 'job'.
+    - size (int): Number of videos to download.
+    - args (argparse.Namespace): The parsed arguments.
+    - overrides (Dict[str, str]): Configuration values given with --set.
+
+    Returns:
+    - dict: The measurements reported by the run, plus the requests and emails the stand-ins received.
+    """
+    from standins import LocalStandins, StandinState
+
+    per_channel = max(1, min(args.videos_per_channel, size))
+    state = StandinState(channels=math.ceil(size / per_channel), videos_per_channel=per_channel,
+                         video_size=args.video_size_kb * 1024, latency=args.latency_ms / 1000)
+    work_directory = tempfile.mkdtemp(prefix=f'bench-{entry}-{size}-')
+    with LocalStandins(state) as standins:
+        config = {**BASE_CONFIG, 'MAX_VIDEOS_TO_DOWNLOAD': str(per_channel), **standins.config(), **overrides}
+        write_config(os.path.join(work_directory, 'config.env'), config)
+        result_path = os.path.join(work_directory, 'result.json')
+        with open(os.path.join(work_directory, 'output.log'), 'w') as output:
+            process = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-one', result_path],
+                                     cwd=work_directory, stdout=output, stderr=subprocess.STDOUT,
+                                     env={**os.environ, 'BENCHMARK_ENTRY': entry})
+        if process.returncode != 0 or not os.path.exists(result_path):
+            raise RuntimeError(f"Benchmark run {entry}/{size} failed; see {work_directory}/output.log")
+        with open(result_path, encoding='utf-8') as file:
+            result = json.load(file)
+
+    result.update(entry=entry, size=size, requests=dict(state.counters), uploads=len(state.uploaded_files),
+                  emails=len(state.emails))
+    if args.keep:
+        result['work_directory'] = work_directory
+    else:
+        shutil.rmtree(work_directory, ignore_errors=True)
+    return result
+
+def _time_calls(owner: type, name: str, timings: List[float]) -> None:
+    """Replace a method of owner with a wrapper that appends the duration of every call to timings."""
+    original = owner.__dict__[name]
+    function = original.__func__ if isinstance(original, staticmethod) else original
+
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            timings.append(time.perf_counter() - started)  # list.append is atomic, so workers need no lock
+
+    setattr(owner, name, staticmethod(timed) if isinstance(original, staticmethod) else timed)
+
+def run_one(result_path: str) -> None:
+    """Run one benchmark in the current directory, which holds its config.env, and write the measurements.
+
+    Args:
+    - result_path (str): Where the measurements are written as JSON.
+
+    Returns:
+    - None
+    """
+    sys.path[:0] = [PACKAGE_DIRECTORY, BENCHMARKS_DIRECTORY]  # The benchmarks directory provides the yt-dlp plugin
+    started = time.perf_counter()
+    from link_extractor import VideoLinkExtractor
+    from downloader_checker import DownloaderManager
+    from baidu_cloud_uploader import BaiduCloudUploader
+    from notifier import Notifier, get_notification_queue
+    import video_downloader
+    import scheduler
+    from metrics import metrics
+    import_seconds = time.perf_counter() - started
+
+    timings: Dict[str, List[float]] = defaultdict(list)
+    instrumented: Dict[str, Tuple[type, str]] = {
+        'discover': (VideoLinkExtractor, 'extract_video_links_from_page'),
+        'extract': (DownloaderManager, 'extract_video'),
+        'download': (DownloaderManager, 'download_extracted'),
+        'upload': (BaiduCloudUploader, 'upload_file'),
+        'notify': (Notifier, 'send_notification'),
+    }
+    for stage, (owner, name) in instrumented.items():
+        _time_calls(owner, name, timings[stage])
+
+    entry = os.environ.get('BENCHMARK_ENTRY', 'main')
+    started = time.perf_counter()
+    if entry == 'job':
+        scheduler.job()
+        downloaded = [os.path.join(video_downloader.config["DOWNLOAD_PATH"], name)
+                      for name in os.listdir(video_downloader.config["DOWNLOAD_PATH"])]
+    else:
+        downloaded = [os.path.join(video_downloader.config["DOWNLOAD_PATH"], name) for name in video_downloader.main()]
+    elapsed = time.perf_counter() - started
+    get_notification_queue().close(timeout=None)  # Deliver the queued digest, which the job does not wait for
+
+    result = {
+        'import_seconds': import_seconds,
+        'seconds': elapsed,
+        'downloaded': len(downloaded),
+        'bytes': sum(os.path.getsize(path) for path in downloaded if os.path.isfile(path)),
+        'peak_rss_mb': _peak_rss_mb(),
+        'stages': {stage: timings[stage] for stage in STAGES},
+        'counters': {name: sum(series['value'] for series in values)
+                     for name, values in metrics.snapshot()['counters'].items()},
+    }
+    with open(result_path, 'w', encoding='utf-8') as file:
+        json.dump(result, file)
+
+def _peak_rss_mb():
+    """Return the peak resident set size of this process in MiB, or None where the resource module is missing."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024  # Bytes on macOS, KiB on Linux
+
+def summarize(result: dict) -> dict:
+    """Turn the raw measurements of a run into the reported numbers."""
+    seconds = result['seconds']
+    summary = {
+        'entry': result['entry'],
+        'videos': result['size'],
+        'downloaded': result['downloaded'],
+        'seconds': round(seconds, 3),
+        'videos_per_minute': round(result['downloaded'] / seconds * 60, 2) if seconds else None,
+        'bytes_per_second': round(result['bytes'] / seconds) if seconds else None,
+        'peak_rss_mb': round(result['peak_rss_mb'], 1) if result['peak_rss_mb'] is not None else None,
+        'import_seconds': round(result['import_seconds'], 3),
+        'uploads': result['uploads'],
+        'emails': result['emails'],
+        'requests': result['requests'],
+        'counters': result['counters'],
+        'stages': {},
+    }
+    if 'work_directory' in result:
+        summary['work_directory'] = result['work_directory']
+    for stage, durations in result['stages'].items():
+        if durations:
+            ordered = sorted(durations)
+            summary['stages'][stage] = {
+                'calls': len(ordered),
+                'p50_ms': round(statistics.median(ordered) * 1000, 1),
+                'p95_ms': round(ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)] * 1000, 1),
+                'max_ms': round(ordered[-1] * 1000, 1),
+            }
+    return summary
+
+def print_report(summaries: List[dict]) -> None:
+    print(f"{'entry':<6} {'videos':>6} {'done':>5} {'seconds':>8} {'videos/min':>10} {'MB/s':>7} {'peak RSS MB':>11}")
+    for summary in summaries:
+        megabytes_per_second = (summary['bytes_per_second'] or 0) / (1024 * 1024)
+        print(f"{summary['entry']:<6} {summary['videos']:>6} {summary['downloaded']:>5} {summary['seconds']:>8.2f} "
+              f"{summary['videos_per_minute'] or 0:>10.1f} {megabytes_per_second:>7.2f} "
+              f"{summary['peak_rss_mb'] if summary['peak_rss_mb'] is not None else 'n/a':>11}")
+    kept = [summary for summary in summaries if 'work_directory' in summary]
+    if kept:
+        print()
+        for summary in kept:
+            print(f"Kept {summary['entry']}/{summary['videos']}: {summary['work_directory']}")
+    print()
+    print(f"{'entry':<6} {'videos':>6} {'stage':<9} {'calls':>5} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for summary in summaries:
+        for stage, latency in summary['stages'].items():
+            print(f"{summary['entry']:<6} {summary['videos']:>6} {stage:<9} {latency['calls']:>5} "
+                  f"{latency['p50_ms']:>8.1f} {latency['p95_ms']:>8.1f} {latency['max_ms']:>8.1f}")
+
+def main() -> None:
+    args = parse_arguments()
+    if args.run_one:
+        run_one(args.run_one)
+        return
+
+    sys.path.insert(0, BENCHMARKS_DIRECTORY)
+    overrides = dict(item.split('=', 1) for item in args.set)
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    entries = ('main', 'job') if args.entry == 'both' else (args.entry,)
+
+    summaries = []
+    for entry in entries:
+        for size in sizes:
+            print(f"Running {entry} with {size} video(s)...", flush=True)
+            summaries.append(summarize(run_size(entry, size, args, overrides)))
+    print()
+    print_report(summaries)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as file:
+            json.dump(summaries, file, indent=2)
+
+if __name__ == "__main__":
+    main()
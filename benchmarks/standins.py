@@ -0,0 +1,320 @@
+"""
+standins.py v1.1.0
+
+This module provides local stand-ins for the services the downloader talks to, so the benchmarks run offline:
+an HTTP server with synthetic YouTube channel pages, video info and video bytes plus the Baidu Netdisk
+precreate/superfile2/create endpoints, and an SMTP sink that accepts and counts notification emails.
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+PAGE_PADDING = 256 * 1024  # Characters of filler around the links, roughly the weight of a real channel page
+
+def video_id(index: int) -> str:
+    """Return the 11-character ID of the synthetic video with the given index."""
+    return f'bench{index:06d}'
+
+class StandinState:
+    def __init__(self, channels: int, videos_per_channel: int, video_size: int, latency: float = 0.0) -> None:
+        """Initialize the synthetic catalogue shared by the request handlers.
+
+        Args:
+        - channels (int): Number of channels served.
+        - videos_per_channel (int): Number of videos listed on each channel page.
+        - video_size (int): Size of every video file in bytes.
+        - latency (float): Seconds every HTTP response is delayed by, to mimic a remote server.
+
+        Returns:
+        - None
+        """
+        self.channels = channels
+        self.videos_per_channel = videos_per_channel
+        self.video_size = video_size
+        self.latency = latency
+        # Every video shares the same body and differs in its first bytes, so no two uploads have the same content.
+        self.video_body = random.Random(0).randbytes(video_size)
+        self.started_at = int(time.time())
+        self.counters: Dict[str, int] = {}
+        self.uploaded_files: List[str] = []
+        self.emails: List[bytes] = []
+        self._lock = threading.Lock()
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def record_email(self, message: bytes) -> None:
+        with self._lock:
+            self.emails.append(message)
+
+    def channel_videos(self, channel: int) -> List[str]:
+        start = channel * self.videos_per_channel
+        return [video_id(index) for index in range(start, start + self.videos_per_channel)]
+
+    def video_bytes(self, vid: str) -> bytes:
+        header = vid.encode().ljust(64, b'\0')
+        return header + self.video_body[len(header):] if self.video_size > len(header) else header[:self.video_size]
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, like the real servers
+    state: StandinState  # Set on the subclass created by LocalStandins
+
+    def log_message(self, format, *args) -> None:
+        pass  # The benchmark reports its own numbers
+
+    def do_GET(self) -> None:
+        self._dispatch()
+
+    def do_HEAD(self) -> None:
+        self._dispatch()
+
+    def do_POST(self) -> None:
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        routes = (
+            (r'/@bench(\d+)/videos', self._channel_page),
+            (r'/api/videos/([\w-]{11})\.json', self._video_info),
+            (r'/media/([\w-]{11})\.mp4', self._video_file),
+            (r'/rest/2\.0/xpan/file', self._xpan_file),
+            (r'/rest/2\.0/pcs/superfile2', self._superfile2),
+        )
+        for pattern, handler in routes:
+            match = re.fullmatch(pattern, url.path)
+            if match:
+                self.state.count(handler.__name__.lstrip('_'))
+                handler(query, *match.groups())
+                return
+        self._send(404, b'Not found', 'text/plain')
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _send_json(self, data: dict) -> None:
+        self._send(200, json.dumps(data).encode(), 'application/json')
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _channel_page(self, query: dict, channel: str) -> None:
+        """A channel page with the watch links of its videos embedded in filler, like ytInitialData."""
+        channel_index = int(channel)
+        if channel_index >= self.state.channels:
+            self._send(404, b'No such channel', 'text/plain')
+            return
+        links = ','.join(f'{{"videoRenderer":{{"videoId":"{vid}","navigationEndpoint":{{"url":"/watch?v={vid}"}}}}}}'
+                         for vid in self.state.channel_videos(channel_index))
+        filler = 'x' * (PAGE_PADDING // 2)
+        body = f'<html><head><title>Benchmark channel {channel}</title></head><body><script>{filler}' \
+               f'var ytInitialData = {{"contents":[{links}]}};{filler}</script></body></html>'
+        self._send(200, body.encode(), 'text/html; charset=utf-8')
+
+    def _video_info(self, query: dict, vid: str) -> None:
+        """The info the stand-in extractor turns into a yt-dlp info dict."""
+        index = int(vid[len('bench'):])
+        host = self.headers.get('Host')
+        self._send_json({
+            'id': vid,
+            'title': f'Benchmark video {index:06d}',
+            'description': f'Synthetic video {vid} served by the benchmark stand-ins.',
+            'timestamp': self.state.started_at - index * 3600,
+            'duration': 600,
+            'formats': [{
+                'format_id': '18',
+                'url': f'http://{host}/media/{vid}.mp4',
+                'ext': 'mp4',
+                'width': 640,
+                'height': 360,
+                'vcodec': 'avc1.42001E',
+                'acodec': 'mp4a.40.2',
+                'filesize': self.state.video_size,
+            }, {
+                'format_id': '22',  # Larger, so the format selector ranks it after '18'
+                'url': f'http://{host}/media/{vid}.mp4',
+                'ext': 'mp4',
+                'width': 1280,
+                'height': 720,
+                'vcodec': 'avc1.64001F',
+                'acodec': 'mp4a.40.2',
+                'filesize': self.state.video_size * 2,
+            }],
+        })
+
+    def _video_file(self, query: dict, vid: str) -> None:
+        body = self.state.video_bytes(vid)
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if not match:
+            self._send(200, body, 'video/mp4', {'Accept-Ranges': 'bytes'})
+            return
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else len(body) - 1, len(body) - 1)
+        self._send(206, body[start:end + 1], 'video/mp4',
+                   {'Accept-Ranges': 'bytes', 'Content-Range': f'bytes {start}-{end}/{len(body)}'})
+
+    def _xpan_file(self, query: dict) -> None:
+        """The precreate, create and copy methods of the Baidu Netdisk file API."""
+        form = {key: values[0] for key, values in parse_qs(self._read_body().decode()).items()}
+        method = query.get('method')
+        if method == 'precreate':
+            upload_id = hashlib.md5(form.get('path', '').encode()).hexdigest()
+            self._send_json({'errno': 0, 'return_type': 1, 'uploadid': upload_id, 'block_list': []})
+        elif method == 'create':
+            self.state.uploaded_files.append(form.get('path'))
+            self._send_json({'errno': 0, 'path': form.get('path'), 'size': int(form.get('size', 0))})
+        elif method == 'filemanager':
+            self._send_json({'errno': 0, 'info': []})
+        else:
+            self._send_json({'errno': 2, 'errmsg': f'unknown method {method}'})
+
+    def _superfile2(self, query: dict) -> None:
+        """The slice upload: answers with the MD5 of the uploaded slice, which the uploader checks."""
+        body = self._read_body()
+        boundary = re.search(r'boundary=([^;]+)', self.headers.get('Content-Type', ''))
+        data = b''
+        if boundary:
+            for part in body.split(b'--' + boundary.group(1).strip('"').encode()):
+                headers, _, content = part.partition(b'\r\n\r\n')
+                if b'name="file"' in headers:
+                    data = content[:-2] if content.endswith(b'\r\n') else content
+                    break
+        self._send_json({'md5': hashlib.md5(data).hexdigest(), 'partseq': query.get('partseq'),
+                         'request_id': random.getrandbits(48)})
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough ESMTP for smtplib: EHLO, AUTH PLAIN, MAIL, RCPT, DATA, RSET, NOOP and QUIT."""
+    state: StandinState
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self) -> None:
+        self.state.count('smtp_connections')
+        self._reply('220 localhost benchmark SMTP sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self._reply('250-localhost')
+                self._reply('250-AUTH PLAIN')
+                self._reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self._reply('250 localhost')
+            elif verb == 'AUTH':
+                if len(command.split()) < 3:
+                    self._reply('334 ')  # Ask for the credentials, which are not checked
+                    self.rfile.readline()
+                self._reply('235 2.7.0 Authentication successful')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                message = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    message.append(data_line)
+                self.state.record_email(b''.join(message))
+                self._reply('250 2.0.0 Ok: queued')
+            elif verb == 'QUIT':
+                self._reply('221 2.0.0 Bye')
+                return
+            elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                self._reply('250 2.0.0 Ok')
+            else:
+                self._reply('502 5.5.2 Command not implemented')
+
+class _QuietErrorsMixin:
+    def handle_error(self, request, client_address) -> None:
+        # Clients hang up early on purpose, e.g. the streaming page scan once it has found enough links.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+class _HTTPServer(_QuietErrorsMixin, ThreadingHTTPServer):
+    daemon_threads = True
+
+class _SMTPServer(_QuietErrorsMixin, socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+class LocalStandins:
+    def __init__(self, state: StandinState, host: str = '127.0.0.1') -> None:
+        """Initialize the stand-ins on free ports of host.
+
+        Args:
+        - state (StandinState): The synthetic catalogue and the counters the servers update.
+        - host (str): The address the servers listen on.
+
+        Returns:
+        - None
+        """
+        self.state = state
+        handler = type('Handler', (_Handler,), {'state': state})
+        smtp_handler = type('SMTPHandler', (_SMTPHandler,), {'state': state})
+        self.http_server = _HTTPServer((host, 0), handler)
+        self.smtp_server = _SMTPServer((host, 0), smtp_handler)
+        self.host = host
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.http_server.server_address[1]}'
+
+    @property
+    def smtp_port(self) -> int:
+        return self.smtp_server.server_address[1]
+
+    def channel_urls(self) -> List[str]:
+        return [f'{self.base_url}/@bench{channel}/videos' for channel in range(self.state.channels)]
+
+    def config(self) -> Dict[str, str]:
+        """Return the configuration values that point the application at the stand-ins."""
+        return {
+            'YOUTUBE_URL': ','.join(self.channel_urls()),
+            'YOUTUBE_BASE_URL': self.base_url,
+            'BAIDU_API_BASE_URL': self.base_url,
+            'BAIDU_PCS_BASE_URL': self.base_url,
+            'BAIDU_ACCESS_TOKEN': 'benchmark-token',
+            'BAIDU_APP_NAME': 'benchmark',
+            'SMTP_SERVER': self.host,
+            'SMTP_PORT': str(self.smtp_port),
+            'SMTP_USE_TLS': 'false',
+            'SMTP_USERNAME': 'benchmark',
+            'SMTP_PASSWORD': 'benchmark',
+            'SMTP_SENDER': 'benchmark@localhost',
+            'SMTP_RECEIVER': 'receiver@localhost',
+        }
+
+    def __enter__(self) -> 'LocalStandins':
+        for server in (self.http_server, self.smtp_server):
+            thread = threading.Thread(target=server.serve_forever, name=type(server).__name__, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        for server in (self.http_server, self.smtp_server):
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,19 @@
+"""
+local_standin.py v1.0.0
+
+yt-dlp extractor plugin for the watch pages of the benchmark stand-ins. yt-dlp loads it from the
+yt_dlp_plugins package when the benchmarks directory is on sys.path, so the watch links of a local channel
+page are extracted like YouTube videos, with their info served as JSON by the stand-in HTTP server.
+"""
+
+from yt_dlp.extractor.common import InfoExtractor
+
+class LocalStandinIE(InfoExtractor):
+    IE_NAME = 'benchmark:standin'
+    _VALID_URL = r'(?P<base>http://(?:127\.0\.0\.1|localhost):\d+)/watch\?v=(?P<id>[\w-]{11})'
+
+    def _real_extract(self, url):
+        base, video_id = self._match_valid_url(url).group('base', 'id')
+        info = self._download_json(f'{base}/api/videos/{video_id}.json', video_id)
+        info['webpage_url'] = url
+        return info
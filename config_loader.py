@@ -1,4 +1,4 @@
-# config_loader.py v1.4.1
+# config_loader.py v1.12.1
 
 """
 This script is responsible for loading and providing configuration values from a specified environment file,
@@ -6,17 +6,23 @@ ensuring that the application runs with the correct settings.
 """
 
 import os
+import re
+import time
 import logging
-from dotenv import load_dotenv
-from typing import Dict, Union, Tuple, Type, Any
+import threading
+from collections.abc import Mapping
+from dotenv import dotenv_values
+from typing import Dict, Iterator, Optional, Union, Tuple, Type, Any
 
 # Setup logging
 logger = logging.getLogger('config_loader')
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 def load_config(file_path: str = "config.env") -> Dict[str, Any]:
     """
     Load configuration values from an environment file.
+
+    Variables set in the process environment take precedence over the file. The process environment is not
+    modified, so the file can be read again after it changes.
     
     Arus:
     - file_path : str : Path to the environment file (default is "config.env").
@@ -24,20 +30,30 @@ def load_config(file_path: str = "config.env") -> Dict[str, Any]:
     Returns:
     - dict : A dictionary containing the configuration values.
     """
-    load_dotenv(file_path)
-
+    values = {**dotenv_values(file_path), **os.environ}
 
     # Predefined configuration parameters with their expected types
     config_params: Dict[str, Union[Tuple[Type, Any], Type]] = {
-        "YOUTUBE_URL": (str, "https://www.youtube.com/@CNN10/videos"),
+        "YOUTUBE_URL": (list, ["https://www.youtube.com/@CNN10/videos"]),  # Comma-separated list of channels
+        "MAX_DISCOVERY_WORKERS": (int, 4),
+        "DISCOVERY_BACKEND": (str, "page"),
         "DOWNLOAD_PATH": (str,"./videos"),
         "VIDEO_EXTENSION": (str, ".mp4"), 
         "MAX_VIDEOS_TO_DOWNLOAD": (int, 1),
         "MAX_DOWNLOAD_RETRIES": (int, 3),
+        "MAX_CONCURRENT_DOWNLOADS": (int, 1),
+        "MAX_CONNECTIONS_PER_HOST": (int, 2),
+        "MAX_CONCURRENT_EXTRACTIONS": (int, 2),
+        "MAX_CONCURRENT_UPLOADS": (int, 0),
+        "PIPELINE_QUEUE_SIZE": (int, 2),
+        "NOTIFY_BATCH_SIZE": (int, 5),
+        "NOTIFY_DIGEST_WINDOW_SECONDS": (int, 600),
+        "SMTP_KEEPALIVE_SECONDS": (int, 300),
         "YOUTUBE_VIDEO_PATTERN": (str,"/watch\?v=([a-zA-Z0-9_-]+)"),
         "YOUTUBE_BASE_URL": (str,"https://www.youtube.com"),
         "SMTP_SERVER": (str,"smtp.gmail.com"),
         "SMTP_PORT": (int, 587),
+        "SMTP_USE_TLS": (bool, True),
         "SMTP_USERNAME": str,
         "SMTP_PASSWORD": str,
         "SMTP_SENDER": str,
@@ -46,6 +62,10 @@ def load_config(file_path: str = "config.env") -> Dict[str, Any]:
         "MORNING_RUN_MINUTE": (int, 0),
         "EVENING_RUN_HOUR": (int, 21),
         "EVENING_RUN_MINUTE": (int, 0),
+        "SCHEDULE_MODE": (str, "fixed"),
+        "ADAPTIVE_DENSE_INTERVAL_MINUTES": (int, 20),
+        "ADAPTIVE_SPARSE_INTERVAL_MINUTES": (int, 360),
+        "ADAPTIVE_MIN_SAMPLES": (int, 10),
         "LOG_FILENAME": (str, "video_downloader.log"),
         "LOG_DIRECTORY": (str,"./log"),
         "VIDEO_DIRECTORY": (str, "./videos"),
@@ -56,6 +76,8 @@ def load_config(file_path: str = "config.env") -> Dict[str, Any]:
         "ALL_VIDEOS_DOWNLOADED_MESSAGE": (str,"All videos already downloaded. {} videos checked."),
         "REQUEST_TIMEOUT": (int, 10),
         "METADATA_FILE": (str, "./metadata/metadata.json"),
+        "METADATA_BACKEND": (str, "json"),
+        "METADATA_DB_FILE": (str, "./metadata/metadata.db"),
         "YOUTUBE_API_KEY": str,
         "BAIDU_APPID": str,
         "BAIDU_APIKEY": str,
@@ -64,14 +86,39 @@ def load_config(file_path: str = "config.env") -> Dict[str, Any]:
         "BAIDU_REDIRECT_URI": str,
         "BAIDU_APP_NAME": str,
         "BAIDU_ACCESS_TOKEN": str,
+        "BAIDU_API_BASE_URL": (str, "https://pan.baidu.com"),
+        "BAIDU_PCS_BASE_URL": (str, "https://d.pcs.baidu.com"),
+        "BAIDU_UPLOAD_WORKERS": (int, 4),
+        "BAIDU_UPLOAD_RETRIES": (int, 3),
+        "UPLOAD_JOURNAL_TTL": (int, 86400),
         "DEFAULT_METADATA_EXTRACTOR": (str, "yt_dlp"),
         "METADATA_DIRECTORY": (str, "./metadata"),
-        "MAX_RESOLUTION": (int, 720)
+        "CACHE_DIRECTORY": (str, "./cache"),
+        "STATE_DB_FILE": (str, "./metadata/state.db"),
+        "YTDLP_CACHE_DIR": (str, "./cache/yt-dlp"),
+        "PAGE_CACHE_TTL": (int, 0),
+        "INFO_CACHE_TTL": (int, 86400),
+        "STREAM_CACHE_TTL": (int, 3600),
+        "INFO_CACHE_MAX_SIZE_MB": (int, 64),
+        "METRICS_DIRECTORY": (str, "./metrics"),
+        "METRICS_TEXTFILE": (str, ""),
+        "MAX_RESOLUTION": (int, 720),
+        "MIN_RESOLUTION": (int, 360),
+        "VIDEO_CODECS": (str, "avc1"),
+        "AUDIO_CODECS": (str, "mp4a"),
+        "VIDEO_FORMAT": (str, "auto"),
+        "CONCURRENT_FRAGMENTS": (int, 1),
+        "HTTP_CHUNK_SIZE": (str, "0"),
+        "RATE_LIMIT": (str, "0"),
+        "THROTTLE_HOURS": (str, ""),
+        "THROTTLED_RATE_LIMIT": (str, "0"),
+        "EXTERNAL_DOWNLOADER": (str, ""),
+        "EXTERNAL_DOWNLOADER_ARGS": (str, ""),
     }
 
     config = {}
     for key, expected_type_default in config_params.items():
-        value = os.getenv(key)
+        value = values.get(key)
         
         if isinstance(expected_type_default, tuple):
             expected_type, default_value = expected_type_default
@@ -80,6 +127,14 @@ def load_config(file_path: str = "config.env") -> Dict[str, Any]:
         else:
             expected_type = expected_type_default
         
+        if expected_type is list:
+            if isinstance(value, str):
+                value = [item.strip() for item in value.split(',') if item.strip()]
+            if not value:
+                error_message = f"{key} value in config must contain at least one item."
+                logger.error(error_message)
+                raise ValueError(error_message)
+
         if expected_type is int:
             try:
                 value = int(value)
@@ -88,12 +143,177 @@ def load_config(file_path: str = "config.env") -> Dict[str, Any]:
                 logger.error(error_message)
                 raise ValueError(error_message)
         
+        if expected_type is bool and isinstance(value, str):
+            if value.strip().lower() not in ('true', 'false', '1', '0', 'yes', 'no'):
+                error_message = f"{key} value in config is not a valid boolean."
+                logger.error(error_message)
+                raise ValueError(error_message)
+            value = value.strip().lower() in ('true', '1', 'yes')
+
         config[key] = value
-    
+
+    _validate_download_tuning(config)
     return config
 
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+def parse_size(key: str, value: str) -> int:
+    """
+    Parse a byte size such as '512K', '10M' or '1048576'.
+
+    Args:
+    - key : str : The configuration key, for the error message.
+    - value : str : The size, with an optional K, M or G suffix (powers of 1024).
+
+    Returns:
+    - int : The size in bytes.
+    """
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?)i?B?\s*', str(value), re.IGNORECASE)
+    if not match:
+        error_message = f"{key} value in config is not a valid size, e.g. 512K or 10M."
+        logger.error(error_message)
+        raise ValueError(error_message)
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+def _validate_download_tuning(config: Dict[str, Any]) -> None:
+    """
+    Check the download tuning keys and convert them in place: sizes and rates to bytes, and THROTTLE_HOURS to a
+    (start, end) tuple of hours, or None when throttling is off.
+
+    Args:
+    - config : dict : The configuration values.
+
+    Returns:
+    - None
+    """
+    for key in ("HTTP_CHUNK_SIZE", "RATE_LIMIT", "THROTTLED_RATE_LIMIT"):
+        config[key] = parse_size(key, config[key])
+
+    if config["CONCURRENT_FRAGMENTS"] < 1:
+        error_message = "CONCURRENT_FRAGMENTS value in config must be at least 1."
+        logger.error(error_message)
+        raise ValueError(error_message)
+
+    hours = config["THROTTLE_HOURS"].strip()
+    match = re.fullmatch(r'(\d{1,2})\s*-\s*(\d{1,2})', hours)
+    if hours and not (match and all(0 <= int(hour) <= 24 for hour in match.groups())):
+        error_message = "THROTTLE_HOURS value in config must look like 9-18, in hours of the day."
+        logger.error(error_message)
+        raise ValueError(error_message)
+    config["THROTTLE_HOURS"] = (int(match.group(1)), int(match.group(2))) if hours else None
+
+    config["EXTERNAL_DOWNLOADER"] = config["EXTERNAL_DOWNLOADER"].strip().lower()
+
+class Config(Mapping):
+    """Read-only view of the configuration that loads on first access and reloads when the file changes.
+
+    Modules keep one Config and read keys from it at the time they need them, so a long-running process picks up
+    edits to the file without a restart. Components that need a consistent view for a whole run take a snapshot().
+    """
+
+    RELOAD_CHECK_INTERVAL = 1.0  # Seconds between checks of the file's modification time
+
+    def __init__(self, file_path: str = "config.env") -> None:
+        """
+        Initialize the configuration without reading the file yet.
+
+        Args:
+        - file_path : str : Path to the environment file (default is "config.env").
+
+        Returns:
+        - None
+        """
+        self.file_path = file_path
+        self._data: Optional[Dict[str, Any]] = None
+        self._mtime_ns: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self) -> Dict[str, Any]:
+        """Return the current values, loading or reloading them if the file changed since the last check."""
+        now = time.monotonic()
+        if self._data is not None and now - self._checked_at < self.RELOAD_CHECK_INTERVAL:
+            return self._data
+        with self._lock:
+            if self._data is None or now - self._checked_at >= self.RELOAD_CHECK_INTERVAL:
+                self._checked_at = now
+                mtime_ns = _mtime_ns(self.file_path)
+                if self._data is None or mtime_ns != self._mtime_ns:
+                    self._load(mtime_ns)
+        return self._data
+
+    def _load(self, mtime_ns: Optional[int]) -> None:
+        """Load the file; the caller holds the lock. An invalid edit keeps the previous values."""
+        try:
+            data = load_config(self.file_path)
+        except ValueError:
+            if self._data is None:
+                raise
+            logger.error(f"Keeping the previous configuration until {self.file_path} is fixed.")
+        else:
+            if self._data is not None:
+                logger.info(f"Reloaded configuration from {self.file_path}.")
+            self._data = data
+        self._mtime_ns = mtime_ns
+
+    def reload(self) -> None:
+        """
+        Reload the file now, without waiting for the next modification time check.
+
+        Returns:
+        - None
+        """
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self._load(_mtime_ns(self.file_path))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return a copy of the current values that does not change on reload.
+
+        Returns:
+        - dict : The configuration values.
+        """
+        return dict(self._current())
+
+    def __getitem__(self, key: str) -> Any:
+        return self._current()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._current())
+
+    def __len__(self) -> int:
+        return len(self._current())
+
+def _mtime_ns(file_path: str) -> Optional[int]:
+    """Return the modification time of a file, or None if it does not exist."""
+    try:
+        return os.stat(file_path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+_configs: Dict[str, Config] = {}
+_configs_lock = threading.Lock()
+
+def get_config(file_path: str = "config.env") -> Config:
+    """
+    Return the process-wide configuration of an environment file. Nothing is read until a key is accessed.
+
+    Args:
+    - file_path : str : Path to the environment file (default is "config.env").
+
+    Returns:
+    - Config : The shared configuration object.
+    """
+    with _configs_lock:
+        config = _configs.get(file_path)
+        if config is None:
+            config = _configs[file_path] = Config(file_path)
+        return config
+
 # Example usage
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     try:
         config_data = load_config()
         print(config_data)
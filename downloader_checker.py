@@ -1,5 +1,5 @@
 """
- downloader_checker.py v2.4.1
+ downloader_checker.py v2.12.4
 
 This script is responsible for checking the availability of new videos and managing their download process. It utilizes the video_downloader module to perform the actual download, and it ensures that each video is only downloaded once by checking against a record of previously downloaded videos.
 """
@@ -8,182 +8,278 @@ import time
 import os
 import logging
 import random  
-from typing import List, Tuple, Any, Optional
-
-import yt_dlp
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple, Any, Optional, Union
+from urllib.parse import urlparse
 
 from utils import sanitize_filename
-from config_loader import load_config
 from metadata_manager import MetadataManager
+from library_index import LibraryIndex
+from info_cache import video_id_from_url
+from metrics import metrics, LATENCY_BUCKETS
 
 logger = logging.getLogger(__name__)
 
-config = load_config()
 
 class DownloaderManager:
 
-    def __init__(self, videos: List[dict], downloader: Any, config: dict) -> None:
+    def __init__(self, videos: List[Union[str, dict]], downloader: Any, config: dict) -> None:
         """Initialize the DownloaderManager with videos to be downloaded, a downloader, and configuration.
         
         Args:
-        - videos : list : A list of video information to be downloaded.
+        - videos : list : A list of video URLs, or of dicts with the video 'url' and the 'channel' it was found on.
         - downloader : YTDownloader : An instance of YTDownloader to perform the actual download.
-        - config : dict : Configuration parameters.
+        - config : Mapping : Configuration parameters, e.g. the shared object returned by get_config().
         
         Returns:
         - None
         """
         self.videos = videos
         self.downloader = downloader
+        self.config = config
         self.metadata_manager = MetadataManager(config)  # 创建MetadataManager的实例，并传递配置
+        self.max_workers = max(1, config.get("MAX_CONCURRENT_DOWNLOADS", 1))
+        self.max_connections_per_host = max(1, config.get("MAX_CONNECTIONS_PER_HOST", 2))
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._host_slots_lock = threading.Lock()
+        self.library = LibraryIndex(config["STATE_DB_FILE"], hash_cache=getattr(downloader, 'hash_cache', None))
+        self.library.scan(downloader.output_directory, config["VIDEO_EXTENSION"], self.metadata_manager.get_all_metadata())
 
     def should_download(self, video_info: dict) -> bool:
-        """Determine if a video should be downloaded based on its title and metadata.
+        """Determine if a video should be downloaded, by looking up its ID in the library index.
         
         Args:
-        - video_info : dict : Information about the video to be downloaded.
+        - video_info : dict : Information about the video to be downloaded; only its 'id' is used.
         
         Returns:
         - bool : True if the video should be downloaded, False otherwise.
         """
-        sanitized_title = sanitize_filename(video_info['title'])
-        video_path = os.path.join(self.downloader.output_directory, sanitized_title + config["VIDEO_EXTENSION"])
+        return video_info['id'] not in self.library
 
-        # Check if the file exists in the file system and metadata exists.
-        return not (os.path.exists(video_path) and self.metadata_manager.query_metadata(video_info['id']))
-
-    def store_video_metadata(self, video_info: dict) -> None:
+    def store_video_metadata(self, video_info: dict, channel: Optional[str] = None, video_path: Optional[str] = None) -> None:
         """Store video metadata using MetadataManager.
 
         Parameters:
         - video_info : dict : Information about the video to be downloaded.
+        - channel : str : (Optional) URL of the channel the video was discovered on.
+        - video_path : str : (Optional) Path of the downloaded file. Defaults to the sanitized title in the output directory.
 
         Returns:
         - None
         """
-        sanitized_title = sanitize_filename(video_info['title'])
-        video_path = os.path.join(self.downloader.output_directory, sanitized_title + '.mp4')
+        if not video_path:
+            video_path = self._default_video_path(video_info)
         metadata = {
             'id': video_info['id'], 
             'title': video_info['title'],
-            'url': video_info['url'],
+            'url': video_info.get('url', video_info.get('webpage_url')),  # Cached info may have no stream URL
             'description': video_info['description'],
-            'published_at': video_info.get('published_at', 'Unknown Date'),
+            'published_at': video_info.get('published_at') or self._published_at(video_info),
             'video_path': video_path,
             'downloaded_at': time.strftime('%Y-%m-%d %H:%M:%S')
         }
+        if channel:
+            metadata['channel'] = channel
 
-        self.metadata_manager.save_or_update_metadata(metadata)
+        with metrics.timer('metadata_write_seconds'):
+            self.metadata_manager.save_or_update_metadata(metadata)  # The metadata store serializes concurrent writes
+
+    @staticmethod
+    def _published_at(video_info: dict) -> str:
+        """Return the publish time of a video in ISO 8601 UTC, from the 'timestamp' reported by yt-dlp."""
+        timestamp = video_info.get('timestamp')
+        if not timestamp:
+            return 'Unknown Date'
+        return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def _default_video_path(self, video_info: dict) -> str:
+        """Return the path a video is saved to by default, built from its sanitized title."""
+        sanitized_title = sanitize_filename(video_info['title'])
+        return os.path.join(self.downloader.output_directory, sanitized_title + '.mp4')
 
     def check_and_download(self) -> List[str]:
         """Prepare to download videos and return a list of filenames of downloaded videos.
 
+        With MAX_CONCURRENT_DOWNLOADS greater than 1 the videos are downloaded by a bounded worker pool,
+        otherwise they are downloaded one after another. The filenames keep the order of self.videos.
+
         Args:
         - None
                 
         Returns:
         - List[str] : A list of filenames of the downloaded videos.
         """
-        downloaded_filenames = []  # Used to store filenames of downloaded videos
-        downloaded_count = 0
-        # downloaded_titles = []  
+        videos = [video for video in self.videos if not self._is_known(video)]
+        logger.info(f"Preparing to download {len(videos)} videos with {self.max_workers} worker(s)...")
 
-        logger.info(f"Preparing to download {len(self.videos)} videos...")
+        if self.max_workers == 1 or len(videos) <= 1:
+            results = [self._download_or_log(video_url) for video_url in videos]
+        else:
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='downloader') as executor:
+                results = list(executor.map(self._download_or_log, videos))  # map() preserves input order
 
-        for video_url in self.videos:
-            try:
-                downloaded_title, cleaned_filename = self._download_single_video(video_url)  # Get original title and cleaned filename
-                if cleaned_filename: # If there's a cleaned filename, the video has been successfully downloaded
-                    downloaded_filenames.append(cleaned_filename)   # Save cleaned filename
-                    downloaded_count += 1
-            except Exception as e:
-                logger.error(f"Failed to download video from {video_url}. Error: {e}.", exc_info=True)  # Logging more error info
-                
-        return downloaded_filenames
-    
-    def _download_single_video(self, video_url: str) -> Tuple[Optional[str], Optional[str]]:
+        # If there's a cleaned filename, the video has been successfully downloaded
+        return [cleaned_filename for cleaned_filename in results if cleaned_filename]
+
+    def _is_known(self, video: Union[str, dict]) -> bool:
+        """Check whether a discovered video is already downloaded, using the ID from the channel listing.
+
+        Args:
+        - video : str or dict : URL of the video, or a discovery entry. The ID is taken from the entry of the 'flat'
+          discovery backend, or else parsed from the watch URL, so no backend needs to extract the video.
+
+        Returns:
+        - bool : True if the video is known to be downloaded, False if it still has to be checked.
+        """
+        video_url = video if isinstance(video, str) else video['url']
+        video_id = None if isinstance(video, str) else video.get('id')
+        video_id = video_id or video_id_from_url(video_url)
+        if not video_id or self.should_download({'id': video_id}):
+            return False
+        title = None if isinstance(video, str) else video.get('title')
+        logger.info(f"Video {title or video_url} already exists. Skipping without extraction.")
+        return True
+
+    def _download_or_log(self, video: Union[str, dict]) -> Optional[str]:
+        """Download a single video, logging unexpected errors so one video cannot abort the batch.
+
+        Args:
+        - video : str or dict : URL of the video to be downloaded, or a dict with its 'url' and 'channel'.
+
+        Returns:
+        - Optional[str] : The cleaned filename of the downloaded video, or None if nothing was downloaded.
+        """
+        video_url, channel = (video, None) if isinstance(video, str) else (video['url'], video.get('channel'))
+        try:
+            _, cleaned_filename = self._download_single_video(video_url, channel)  # Get original title and cleaned filename
+            return cleaned_filename
+        except Exception as e:
+            logger.error(f"Failed to download video from {video_url}. Error: {e}.", exc_info=True)  # Logging more error info
+            return None
+
+    @contextmanager
+    def _host_slot(self, host: str) -> Iterator[None]:
+        """Hold one of the MAX_CONNECTIONS_PER_HOST connection slots for a media host.
+
+        Args:
+        - host : str : The host the video is about to be downloaded from, e.g. rr1---sn-xxx.googlevideo.com.
+
+        Returns:
+        - Iterator[None] : A context in which the caller may download from the host.
+        """
+        with self._host_slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.max_connections_per_host)
+        with slot:
+            yield
+
+    def _download_single_video(self, video_url: str, channel: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
         """Try downloading a single video and return the title if successful.
         
         Args:
         - video_url : str : URL of the video to be downloaded.
+        - channel : str : (Optional) URL of the channel the video was discovered on.
         
         Returns:
         - tuple[Optional[str], Optional[str]] : Tuple containing the title and filename of the downloaded video if successful, None otherwise.
         """
-        retries = 0
-        max_retries = config.get("MAX_DOWNLOAD_RETRIES", 3)  # Getting the value from config with a default
+        video_info = self.extract_video(video_url, channel)
+        if video_info is None:
+            return None, None  # Already downloaded, or the extraction failed after retries
+        video_path = self.download_extracted(video_info, video_url, channel)
+        if video_path is None:
+            return None, None  # Return None if the download failed after retries
+        return video_info['title'], os.path.basename(video_path)  # Return the title and filename of the downloaded video
 
-        while retries < max_retries:
-            try:
-                video_info = self.downloader.get_video_info(video_url)
-
-                if self.should_download(video_info):
-                    print(f"Downloading: {video_info['title']}")
-                    self.downloader.download_video(video_url)
-                    self.store_video_metadata(video_info)
-                    sanitized_title = sanitize_filename(video_info['title']) + config["VIDEO_EXTENSION"]
-                    return video_info['title'], sanitized_title  # Return the title and filename of the downloaded video
-                else:
-                    logger.info(f"Video {video_info['title']} already exists. Skipping download.")
-                    print(f"Video {video_info['title']} already exists. Skipping download.")
-                    return None, None  # Return None if the video was not downloaded
+    def extract_video(self, video: Union[str, dict], channel: Optional[str] = None) -> Optional[dict]:
+        """Extract the info of a video that still has to be downloaded.
 
-            except Exception as e:
-                retries += 1
-                logger.error(f"Error downloading video from {video_url}. Error: {e}. Retrying {retries}/{max_retries}...")
-                time.sleep((retries + 1) * 5 + random.randint(1, 5))  # Exponential backoff with randomness
+        Args:
+        - video : str or dict : URL of the video, or a discovery entry with its 'url' and 'channel'.
+        - channel : str : (Optional) URL of the channel the video was discovered on, if video is a URL.
 
-        logger.error(f"Failed to download video from {video_url} after {max_retries} retries.")
-        return None, None  # Return None if the download failed after retries
-    
-    def get_suitable_formats(self, video_url: str) -> List[str]:
-        """Get a list of suitable format IDs for a given video URL.
-        
-        Arus:
-        - video_url : str : The URL of the video to get suitable formats for.
+        Returns:
+        - Optional[dict] : The info dict, or None if the video is already downloaded or could not be extracted.
+        """
+        if self._is_known(video):
+            return None
+        video_url, channel = (video, channel) if isinstance(video, str) else (video['url'], video.get('channel'))
+
+        video_info = self._with_retries(video_url, lambda attempt: self.downloader.get_video_info(video_url))
+        if video_info is None:
+            return None
+        if not self.should_download(video_info):
+            logger.info(f"Video {video_info['title']} already exists. Skipping download.")
+            print(f"Video {video_info['title']} already exists. Skipping download.")
+            return None
+        return video_info
+
+    def download_extracted(self, video_info: dict, video_url: str, channel: Optional[str] = None) -> Optional[str]:
+        """Download a video from its extracted info, then store its metadata and add it to the library index.
+
+        Args:
+        - video_info : dict : The info dict returned by extract_video.
+        - video_url : str : URL of the video, used to extract it again when a retry needs fresh stream URLs.
+        - channel : str : (Optional) URL of the channel the video was discovered on.
 
         Returns:
-        - List[str] : A list of strings representing suitable format IDs for the video, sorted by file size.
+        - Optional[str] : The path of the downloaded file, or None if the download failed after retries.
         """
-        max_resolution = self.config.get('MAX_RESOLUTION') 
-        ydl_opts = {
-        'quiet': True,
-        'no_progress': True,
-        'no_warnings': True,
-        }
-    
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(video_url, download=False)
-            formats = info_dict.get('formats', [])
-            
-            suitable_formats = [
-                f for f in formats 
-                if f['ext'] == 'mp4' and f.get('height') and f['height'] <= max_resolution
-            ]
-            
-            suitable_formats.sort(key=lambda f: f['filesize'] or 0)
-            
-            format_ids = [str(f['format_id']) for f in suitable_formats]
-            
-            return format_ids
-        
-    def download_video_with_format(self, video_url: str) -> None:
-        """Download a video in a suitable format from a list of format IDs.
-        
+        def download(attempt: int) -> str:
+            # A failed download drops the cached stream URLs, so retries look the video up again.
+            info = video_info if attempt == 0 else self.downloader.get_video_info(video_url)
+            print(f"Downloading: {info['title']}")
+            with self._host_slot(_media_host(info, video_url)):
+                video_path = self.downloader.download_video(video_url, info=info)  # Reuse the extracted info
+            return video_path or self._default_video_path(info)
+
+        video_path = self._with_retries(video_url, download)
+        if video_path is None:
+            return None
+        self.store_video_metadata(video_info, channel, video_path)
+        self.library.record(video_info['id'], video_path)
+        if video_info.get('timestamp'):
+            metrics.observe('publish_to_download_seconds', time.time() - video_info['timestamp'], LATENCY_BUCKETS)
+        return video_path
+
+    def _with_retries(self, video_url: str, action: Callable[[int], Any]) -> Any:
+        """Run an action on a video, retrying with backoff up to MAX_DOWNLOAD_RETRIES times.
+
         Args:
-        - video_url : str : The URL of the video to be downloaded.
+        - video_url : str : URL of the video the action fetches.
+        - action : Callable[[int], Any] : Called with the attempt number, starting at 0.
 
         Returns:
-        - None
+        - Any : The result of the action, or None if every attempt failed.
         """
-        format_list = self.get_suitable_formats(video_url)
-        
-        for fmt in format_list:
+        retries = 0
+        max_retries = self.config.get("MAX_DOWNLOAD_RETRIES", 3)  # Getting the value from config with a default
+
+        while retries < max_retries:
             try:
-                 # Attempt to download
-                self.downloader.download_video(video_url, fmt)
-                # If download is successful, exit the loop
-                break
+                return action(retries)
             except Exception as e:
-                # If download fails, continue trying with other formats
-                logger.error(f"Error downloading {video_url} with format {fmt}: {e}")
+                retries += 1
+                if retries < max_retries:
+                    metrics.inc('retries_total')
+                logger.error(f"Error downloading video from {video_url}. Error: {e}. Retrying {retries}/{max_retries}...")
+                time.sleep((retries + 1) * 5 + random.randint(1, 5))  # Exponential backoff with randomness
+
+        logger.error(f"Failed to download video from {video_url} after {max_retries} retries.")
+        metrics.inc('videos_failed_total')
+        return None
+
+def _media_host(video_info: dict, video_url: str) -> str:
+    """Return the host the media of a video is served from, falling back to the host of its watch URL.
+
+    The formats of one video are served from the same host, so the first format URL stands for the chosen one.
+    """
+    urls = [video_info.get('url')] + [fmt.get('url') for fmt in video_info.get('formats') or []]
+    for url in urls:
+        if url:
+            return urlparse(url).netloc
+    return urlparse(video_url).netloc
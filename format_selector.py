@@ -0,0 +1,139 @@
+"""
+format_selector.py v1.0.1
+
+This module chooses the download format of a video from the formats list of its extracted info: the smallest
+format within the configured resolution range and codecs, followed by the next smallest ones as fallbacks.
+The ranked choice is stored per video in the local state database, so later attempts and runs reuse it
+without ranking or extracting again.
+"""
+
+import json
+import time
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from state_db import StateDB
+
+logger = logging.getLogger('format_selector')
+
+# Used when no format meets the constraints: the best one up to the maximum height, or else any
+FALLBACK_FORMAT = 'best[height<={max_resolution}]/best'
+
+class FormatSelector:
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS format_choice (
+            video_id TEXT PRIMARY KEY,
+            constraints TEXT NOT NULL,
+            ranking TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    '''
+
+    def __init__(self, db_path: str, max_resolution: int, min_resolution: int = 0,
+                 video_codecs: Sequence[str] = ('avc1',), audio_codecs: Sequence[str] = ('mp4a',),
+                 max_choices: int = 5) -> None:
+        """Initialize the format selector.
+
+        Args:
+        - db_path (str): Path of the local state database the choices are stored in.
+        - max_resolution (int): Largest video height allowed, e.g. 720.
+        - min_resolution (int): Smallest video height allowed, e.g. 360.
+        - video_codecs (Sequence[str]): Allowed video codec families, e.g. ('avc1', 'vp9'). Empty allows any.
+        - audio_codecs (Sequence[str]): Allowed audio codec families, e.g. ('mp4a',). Empty allows any.
+        - max_choices (int): Number of formats kept in a ranking, the first one and its fallbacks.
+
+        Returns:
+        - None
+        """
+        self.db = StateDB(db_path, self.SCHEMA)
+        self.max_resolution = max_resolution
+        self.min_resolution = min_resolution
+        self.video_codecs = tuple(codec.lower() for codec in video_codecs)
+        self.audio_codecs = tuple(codec.lower() for codec in audio_codecs)
+        self.max_choices = max(1, max_choices)
+        self.fallback_format = FALLBACK_FORMAT.format(max_resolution=max_resolution)
+
+    def constraints(self, allow_merge: bool) -> str:
+        """Describe the constraints a ranking was made under; a stored ranking is only reused under the same ones."""
+        return json.dumps([self.min_resolution, self.max_resolution, self.video_codecs, self.audio_codecs, allow_merge])
+
+    def choices(self, info: dict, allow_merge: bool = False) -> Tuple[List[str], bool]:
+        """Return the ranked format specs of a video, from the stored ranking or by ranking its formats list.
+
+        Args:
+        - info (dict): The extracted info dict. Its 'formats' are only needed when no ranking is stored.
+        - allow_merge (bool): Whether a video-only format may be combined with an audio-only one; needs ffmpeg.
+
+        Returns:
+        - Tuple[List[str], bool]: The format specs, smallest first, e.g. ['134+139', '18'], and whether the
+          ranking was stored already.
+        """
+        video_id = info['id']
+        constraints = self.constraints(allow_merge)
+        rows = self.db.query('SELECT constraints, ranking FROM format_choice WHERE video_id = ?', (video_id,))
+        if rows and rows[0]['constraints'] == constraints:
+            return json.loads(rows[0]['ranking']), True
+
+        ranking = self.rank(info.get('formats') or [], info.get('duration'), allow_merge)
+        if not ranking:
+            logger.warning(f"No format of {video_id} is within {self.min_resolution}-{self.max_resolution}p "
+                           f"with codecs {self.video_codecs or 'any'}/{self.audio_codecs or 'any'}. "
+                           f"Using '{self.fallback_format}'.")
+            return [self.fallback_format], False
+        self.db.execute('INSERT OR REPLACE INTO format_choice (video_id, constraints, ranking, updated_at) '
+                        'VALUES (?, ?, ?, ?)', (video_id, constraints, json.dumps(ranking), time.time()))
+        return ranking, False
+
+    def rank(self, formats: Iterable[dict], duration: Optional[float] = None, allow_merge: bool = False) -> List[str]:
+        """Rank the formats meeting the constraints by estimated size, smallest first.
+
+        Args:
+        - formats (Iterable[dict]): The 'formats' list of an info dict.
+        - duration (float): (Optional) Duration of the video in seconds, used to estimate sizes from bitrates.
+        - allow_merge (bool): Whether video-only formats are combined with the smallest allowed audio-only format.
+
+        Returns:
+        - List[str]: Up to max_choices format specs. Formats of unknown size come after all others.
+        """
+        candidates: Dict[str, Tuple[float, int]] = {}  # Spec -> (estimated size, height)
+        audio = None
+        for fmt in formats:
+            if fmt.get('has_drm') or not fmt.get('format_id'):
+                continue
+            has_video, has_audio = fmt.get('vcodec') not in (None, 'none'), fmt.get('acodec') not in (None, 'none')
+            size = _estimated_size(fmt, duration)
+            if has_audio and not has_video:
+                if _codec_allowed(fmt['acodec'], self.audio_codecs) and (audio is None or size < audio[1]):
+                    audio = (fmt['format_id'], size)
+            elif has_video and self._video_allowed(fmt):
+                if has_audio and _codec_allowed(fmt['acodec'], self.audio_codecs):
+                    candidates[fmt['format_id']] = (size, fmt['height'])
+                elif not has_audio and allow_merge:
+                    candidates[fmt['format_id'] + '+'] = (size, fmt['height'])  # Completed with the audio below
+
+        ranked = []
+        for spec, (size, height) in candidates.items():
+            if spec.endswith('+'):
+                if audio is None:
+                    continue
+                spec, size = spec + audio[0], size + audio[1]
+            ranked.append((size, -height, spec))
+        return [spec for _, _, spec in sorted(ranked)[:self.max_choices]]
+
+    def _video_allowed(self, fmt: dict) -> bool:
+        height = fmt.get('height')
+        return (height is not None and self.min_resolution <= height <= self.max_resolution
+                and _codec_allowed(fmt['vcodec'], self.video_codecs))
+
+def _codec_allowed(codec: str, allowed: Sequence[str]) -> bool:
+    """Check a codec string such as 'avc1.4d401f' against codec families such as ('avc1', 'vp9')."""
+    return not allowed or codec.lower().split('.')[0] in allowed
+
+def _estimated_size(fmt: dict, duration: Optional[float]) -> float:
+    """Return the size of a format in bytes, estimated from its bitrate if yt-dlp reports no size."""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return size
+    if fmt.get('tbr') and duration:
+        return fmt['tbr'] * 1000 / 8 * duration  # tbr is in kbit/s
+    return float('inf')
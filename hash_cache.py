@@ -0,0 +1,123 @@
+"""
+hash_cache.py v1.0.0
+
+This module computes the Baidu Netdisk block MD5 list and whole-file MD5 of a video in one pass,
+and caches them by path, size and modification time so a finished download is never hashed twice.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import List, Optional, Tuple
+
+from state_db import StateDB
+
+logger = logging.getLogger('hash_cache')
+
+BAIDU_BLOCK_SIZE = 4 * 1024 * 1024  # Block size required by the Baidu Netdisk upload API
+
+def compute_block_hashes(file_path: str, block_size: int = BAIDU_BLOCK_SIZE) -> Tuple[List[str], str]:
+    """Hash a file block by block and as a whole in a single read.
+
+    Args:
+    - file_path (str): Path to the file.
+    - block_size (int): Size of each block (default is 4MB).
+
+    Returns:
+    - Tuple[List[str], str]: The MD5 of each block and the MD5 of the whole file. An empty file has one empty block.
+    """
+    block_list = []
+    file_md5 = hashlib.md5()
+    buffer = bytearray(block_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb') as f:
+        while True:
+            length = f.readinto(buffer)  # Reuse one buffer instead of allocating a new bytes object per block
+            if not length and block_list:
+                break
+            block = view[:length]
+            block_list.append(hashlib.md5(block).hexdigest())
+            file_md5.update(block)
+            if length < block_size:
+                break
+    return block_list, file_md5.hexdigest()
+
+class HashCache:
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS file_hashes (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            block_size INTEGER NOT NULL,
+            block_list TEXT NOT NULL,
+            content_md5 TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    '''
+
+    def __init__(self, db_path: str) -> None:
+        """Initialize the hash cache.
+
+        Args:
+        - db_path (str): Path of the local state database.
+
+        Returns:
+        - None
+        """
+        self.db = StateDB(db_path, self.SCHEMA)
+
+    def get(self, file_path: str, block_size: int = BAIDU_BLOCK_SIZE) -> Optional[Tuple[List[str], str]]:
+        """Return the cached hashes of a file if the file has not changed since they were computed.
+
+        Args:
+        - file_path (str): Path to the file.
+        - block_size (int): Block size the hashes must have been computed with.
+
+        Returns:
+        - Optional[Tuple[List[str], str]]: The block MD5 list and whole-file MD5, or None on a cache miss.
+        """
+        stat = os.stat(file_path)
+        rows = self.db.query(
+            'SELECT block_list, content_md5 FROM file_hashes '
+            'WHERE path = ? AND size = ? AND mtime_ns = ? AND block_size = ?',
+            (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, block_size))
+        if not rows:
+            return None
+        return json.loads(rows[0]['block_list']), rows[0]['content_md5']
+
+    def compute(self, file_path: str, block_size: int = BAIDU_BLOCK_SIZE) -> Tuple[List[str], str]:
+        """Hash a file and store the result.
+
+        Args:
+        - file_path (str): Path to the file.
+        - block_size (int): Size of each block (default is 4MB).
+
+        Returns:
+        - Tuple[List[str], str]: The block MD5 list and whole-file MD5.
+        """
+        stat = os.stat(file_path)
+        block_list, content_md5 = compute_block_hashes(file_path, block_size)
+        self.db.execute(
+            'INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, block_size, block_list, content_md5, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, block_size,
+             json.dumps(block_list), content_md5, time.time()))
+        logger.info(f"Hashed {file_path}: {len(block_list)} block(s), MD5 {content_md5}.")
+        return block_list, content_md5
+
+    def get_or_compute(self, file_path: str, block_size: int = BAIDU_BLOCK_SIZE) -> Tuple[List[str], str]:
+        """Return the cached hashes of a file, computing them on a cache miss.
+
+        Args:
+        - file_path (str): Path to the file.
+        - block_size (int): Size of each block (default is 4MB).
+
+        Returns:
+        - Tuple[List[str], str]: The block MD5 list and whole-file MD5.
+        """
+        cached = self.get(file_path, block_size)
+        if cached:
+            return cached
+        return self.compute(file_path, block_size)
@@ -0,0 +1,42 @@
+"""
+hash_postprocessor.py v1.0.0
+
+This module provides the yt-dlp post-processor that hashes each finished video for the Baidu Netdisk upload.
+It lives apart from video_downloader so yt-dlp is only imported once a YoutubeDL instance is created.
+"""
+
+import os
+import logging
+
+from yt_dlp.postprocessor import PostProcessor
+
+logger = logging.getLogger('hash_postprocessor')
+
+class BlockHashPostProcessor(PostProcessor):
+    def __init__(self, hash_cache, downloader=None):
+        """Initialize the post-processor that hashes each finished video for the Baidu Netdisk upload.
+
+        Args:
+        - hash_cache : HashCache : The cache the block MD5 list and whole-file MD5 are stored in.
+        - downloader : YoutubeDL : (Optional) The YoutubeDL instance running the post-processor.
+        """
+        super().__init__(downloader)
+        self.hash_cache = hash_cache
+
+    def run(self, info):
+        """Hash the final file while it is still in the OS page cache.
+
+        Args:
+        - info : dict : The info dict of the finished download; 'filepath' is the final file.
+
+        Returns:
+        - tuple : No files to delete and the unchanged info dict.
+        """
+        file_path = info.get('filepath')
+        if file_path and os.path.exists(file_path):
+            try:
+                self.hash_cache.compute(file_path)
+            except Exception as e:
+                # A missing hash only means the uploader hashes the file itself later.
+                logger.error(f"Failed to hash {file_path}. Error: {e}")
+        return [], info
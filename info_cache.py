@@ -0,0 +1,169 @@
+"""
+info_cache.py v1.0.1
+
+This module caches the info dicts extracted by yt-dlp on disk, gzip-compressed and keyed by video ID, so a second
+look at the same video within the TTL costs no network call. The stream part of each info dict (formats and their
+signed URLs) expires much sooner than the rest and is kept in a separate, short-lived entry. The cache is bounded
+in size and evicts the least recently used videos first.
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import logging
+from typing import Optional
+
+from utils import write_atomic
+
+logger = logging.getLogger('info_cache')
+
+# Keys holding stream URLs, which expire within hours
+STREAM_KEYS = ('formats', 'requested_formats', 'requested_downloads', 'requested_subtitles', 'subtitles',
+               'automatic_captions', 'url', 'manifest_url', 'fragments', 'http_headers')
+# Bulky keys nothing downstream reads
+DROPPED_KEYS = ('thumbnails', 'heatmap')
+
+_VIDEO_ID_PATTERN = re.compile(r'(?:[?&]v=|youtu\.be/|/shorts/)([A-Za-z0-9_-]{11})')
+
+def video_id_from_url(video_url: str) -> Optional[str]:
+    """Return the YouTube video ID of a watch, short or youtu.be URL, or None if it has none."""
+    match = _VIDEO_ID_PATTERN.search(video_url)
+    return match.group(1) if match else None
+
+class InfoCache:
+    def __init__(self, cache_directory: str, ttl: int, stream_ttl: int, max_size_mb: int) -> None:
+        """Initialize the info cache.
+
+        Args:
+        - cache_directory (str): Base cache directory; entries are stored in its 'info' subdirectory.
+        - ttl (int): Seconds the trimmed info dict of a video is trusted. 0 disables the cache.
+        - stream_ttl (int): Seconds the stream URLs of a video are trusted. 0 never caches them.
+        - max_size_mb (int): Size the cache directory is kept under, in megabytes.
+
+        Returns:
+        - None
+        """
+        self.directory = os.path.join(cache_directory, 'info')
+        self.ttl = ttl
+        self.stream_ttl = min(stream_ttl, ttl)
+        self.max_bytes = max_size_mb * 1024 * 1024
+
+    def get(self, video_id: str) -> Optional[dict]:
+        """Return the cached info dict of a video.
+
+        Args:
+        - video_id (str): The YouTube video ID.
+
+        Returns:
+        - Optional[dict]: The info dict, or None on a cache miss. It only has 'formats' and the other stream keys
+          while they are within the stream TTL.
+        """
+        if self.ttl <= 0:
+            return None
+        info = self._load(self._info_path(video_id), self.ttl)
+        if info is None:
+            return None
+        streams = self._load(self._streams_path(video_id), self.stream_ttl) if self.stream_ttl > 0 else None
+        if streams:
+            info.update(streams)
+        logger.debug(f"Info cache hit for {video_id}{'' if streams else ' without streams'}.")
+        return info
+
+    def put(self, info: dict) -> None:
+        """Store a freshly extracted info dict, split into its trimmed metadata and its stream URLs.
+
+        Args:
+        - info (dict): The info dict returned by YoutubeDL.extract_info.
+
+        Returns:
+        - None
+        """
+        video_id = info.get('id')
+        if self.ttl <= 0 or not video_id:
+            return
+        metadata = {key: value for key, value in info.items() if key not in STREAM_KEYS and key not in DROPPED_KEYS}
+        streams = {key: info[key] for key in STREAM_KEYS if key in info}
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            self._write_entry(self._info_path(video_id), metadata)
+            if self.stream_ttl > 0 and streams:
+                self._write_entry(self._streams_path(video_id), streams)
+        except (OSError, TypeError, ValueError) as e:
+            # A value json cannot encode only means this video is extracted again next time.
+            logger.error(f"Failed to cache info of {video_id}: {e}")
+            return
+        self._evict()
+
+    def drop_streams(self, video_id: str) -> None:
+        """Forget the stream URLs of a video, e.g. after they failed to download.
+
+        Args:
+        - video_id (str): The YouTube video ID.
+
+        Returns:
+        - None
+        """
+        try:
+            os.remove(self._streams_path(video_id))
+        except FileNotFoundError:
+            pass
+
+    def _load(self, path: str, ttl: int) -> Optional[dict]:
+        """Return the data of an entry if it exists and is within its TTL, marking it as recently used."""
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as file:
+                entry = json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, ValueError) as e:
+            logger.error(f"Ignoring unreadable info cache entry {path}: {e}")
+            return None
+        if time.time() - entry.get('cached_at', 0) > ttl:
+            return None
+        try:
+            os.utime(path)  # The modification time orders entries for eviction
+        except FileNotFoundError:
+            pass  # Evicted by another thread in the meantime
+        return entry['data']
+
+    def _write_entry(self, path: str, data: dict) -> None:
+        text = json.dumps({'cached_at': time.time(), 'data': data}, ensure_ascii=False)
+        write_atomic(path, gzip.compress(text.encode('utf-8')))
+
+    def _evict(self) -> None:
+        """Remove the least recently used videos until the cache is within its size limit."""
+        videos = {}
+        total = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.json.gz'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                video_id = entry.name.split('.', 1)[0]
+                size, last_used = videos.get(video_id, (0, 0))
+                videos[video_id] = (size + stat.st_size, max(last_used, stat.st_mtime))
+                total += stat.st_size
+        if total <= self.max_bytes:
+            return
+
+        for video_id, (size, _) in sorted(videos.items(), key=lambda item: item[1][1]):
+            for path in (self._info_path(video_id), self._streams_path(video_id)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+            logger.debug(f"Evicted {video_id} from the info cache.")
+            if total <= self.max_bytes:
+                break
+
+    def _info_path(self, video_id: str) -> str:
+        return os.path.join(self.directory, video_id + '.json.gz')
+
+    def _streams_path(self, video_id: str) -> str:
+        return os.path.join(self.directory, video_id + '.streams.json.gz')
@@ -0,0 +1,156 @@
+"""
+library_index.py v1.0.0
+
+This module keeps an index of the downloaded videos, keyed by video ID, with the path, size and checksum of each file.
+The index is reconciled with the download directory by one directory scan at startup and updated on each download,
+so checking whether a video is already downloaded is a set lookup instead of a filesystem check by title.
+"""
+
+import os
+import time
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from state_db import StateDB
+
+logger = logging.getLogger('library_index')
+
+class LibraryIndex:
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS library (
+            video_id TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            content_md5 TEXT,
+            updated_at REAL NOT NULL
+        );
+    '''
+
+    def __init__(self, db_path: str, hash_cache=None) -> None:
+        """Initialize the library index and load the indexed video IDs.
+
+        Args:
+        - db_path (str): Path of the local state database.
+        - hash_cache (HashCache): (Optional) Cache the file checksums are read from. Files are never hashed here.
+
+        Returns:
+        - None
+        """
+        self.db = StateDB(db_path, self.SCHEMA)
+        self.hash_cache = hash_cache
+        self._lock = threading.Lock()
+        self._video_ids = {row['video_id'] for row in self.db.query('SELECT video_id FROM library')}
+
+    def __contains__(self, video_id: str) -> bool:
+        return video_id in self._video_ids
+
+    def __len__(self) -> int:
+        return len(self._video_ids)
+
+    def scan(self, directory: str, extension: str, metadata: Optional[Dict[str, Dict]] = None) -> None:
+        """Reconcile the index with the video files under a directory.
+
+        Indexed files that were moved are found again by name and size, or by size and modification time,
+        and deleted files are dropped. Files not yet indexed are added when a metadata record points to them.
+
+        Args:
+        - directory (str): The download directory, scanned recursively.
+        - extension (str): Extension of the video files, e.g. '.mp4'.
+        - metadata (Dict[str, Dict]): (Optional) Stored metadata keyed by video ID, whose 'video_path' maps files to IDs.
+
+        Returns:
+        - None
+        """
+        files = self._scan_files(directory, extension)
+        rows = self.db.query('SELECT video_id, path, size, mtime_ns FROM library')
+        indexed_paths = {row['path'] for row in rows}
+        unindexed = {path: stat for path, stat in files.items() if path not in indexed_paths}
+        by_name_and_size = {(os.path.basename(path), stat[0]): path for path, stat in unindexed.items()}
+        by_size_and_mtime = {stat: path for path, stat in unindexed.items()}
+
+        updates, deletions = [], []
+        for row in rows:
+            path = row['path']
+            if path in files:
+                if files[path] != (row['size'], row['mtime_ns']):
+                    updates.append(self._row(row['video_id'], path, files[path]))  # Replaced in place
+                continue
+            if not path.startswith(os.path.join(os.path.abspath(directory), '')) and os.path.isfile(path):
+                continue  # Outside the scanned directory and still there
+            moved_to = (by_name_and_size.get((os.path.basename(path), row['size']))
+                        or by_size_and_mtime.get((row['size'], row['mtime_ns'])))
+            if moved_to and moved_to in unindexed:
+                del unindexed[moved_to]
+                updates.append(self._row(row['video_id'], moved_to, files[moved_to]))
+                logger.info(f"Video {row['video_id']} moved from {path} to {moved_to}.")
+            else:
+                deletions.append((row['video_id'],))
+                logger.info(f"Video {row['video_id']} no longer exists at {path}. Removed from the library index.")
+
+        indexed_ids = {row['video_id'] for row in rows} - {deletion[0] for deletion in deletions}
+        for video_id, record in (metadata or {}).items():
+            video_path = record.get('video_path')
+            if video_id not in indexed_ids and video_path and os.path.abspath(video_path) in unindexed:
+                path = os.path.abspath(video_path)
+                updates.append(self._row(video_id, path, unindexed.pop(path)))
+
+        if deletions:
+            self.db.execute_many('DELETE FROM library WHERE video_id = ?', deletions)
+        if updates:
+            self.db.execute_many(
+                'INSERT OR REPLACE INTO library (video_id, path, size, mtime_ns, content_md5, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)', updates)
+        with self._lock:
+            self._video_ids = {row['video_id'] for row in self.db.query('SELECT video_id FROM library')}
+        logger.info(f"Library index holds {len(self._video_ids)} video(s) after scanning {len(files)} file(s) in {directory}.")
+
+    def record(self, video_id: str, file_path: str) -> None:
+        """Add or update a downloaded video.
+
+        Args:
+        - video_id (str): The YouTube video ID.
+        - file_path (str): Path of the downloaded file.
+
+        Returns:
+        - None
+        """
+        path = os.path.abspath(file_path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            logger.error(f"Cannot index video {video_id}: {path} does not exist.")
+            return
+        self.db.execute(
+            'INSERT OR REPLACE INTO library (video_id, path, size, mtime_ns, content_md5, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)', self._row(video_id, path, (stat.st_size, stat.st_mtime_ns)))
+        with self._lock:
+            self._video_ids.add(video_id)
+
+    def _row(self, video_id: str, path: str, stat: Tuple[int, int]) -> Tuple:
+        """Build a library row, taking the checksum from the hash cache if the file was hashed."""
+        content_md5 = None
+        if self.hash_cache:
+            cached = self.hash_cache.get(path)
+            content_md5 = cached[1] if cached else None
+        return (video_id, path, stat[0], stat[1], content_md5, time.time())
+
+    @staticmethod
+    def _scan_files(directory: str, extension: str) -> Dict[str, Tuple[int, int]]:
+        """Return (size, mtime_ns) of every file with the extension under a directory, keyed by absolute path."""
+        files = {}
+        pending = [os.path.abspath(directory)]
+        while pending:
+            try:
+                entries = os.scandir(pending.pop())
+            except FileNotFoundError:
+                continue
+            with entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.name.endswith(extension) and entry.is_file():
+                        stat = entry.stat()
+                        files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return files
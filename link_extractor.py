@@ -1,36 +1,61 @@
 """
-link_extractor.py v1.4.1
+link_extractor.py v1.10.2
 
 This module extracts video links from a specified webpage. 
 """
-import requests
 import re
+import time
 import logging
-from config_loader import load_config
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List
+from urllib.parse import urlparse
+from config_loader import get_config
+from ydl_pool import get_ydl
+from metrics import metrics
+
+if TYPE_CHECKING:
+    import requests
 
 logger = logging.getLogger('link_extractor')
 
-config = load_config()
+config = get_config()
+
+@lru_cache(maxsize=None)
+def _compile_pattern(video_pattern: str) -> re.Pattern:
+    """Compile a video link pattern once per process."""
+    return re.compile(video_pattern)
 
 class VideoLinkExtractor:
+    CHUNK_SIZE = 64 * 1024  # Characters decoded per streamed chunk
+    OVERLAP = 256           # Trailing characters rescanned with the next chunk, so links split across chunks are found
     
     @staticmethod
     def extract_video_links_from_page(url=None, max_links=None, video_pattern=None, 
-                                      base_url=None, timeout=None) -> list:
+                                      base_url=None, timeout=None, stream=True, session=None, page_cache=None) -> list:
         """
         Extract video links from a webpage.
 
+        Video IDs are deduplicated in page order. In streaming mode the page is scanned as chunks arrive
+        and the connection is closed as soon as max_links distinct IDs have been found.
+        With a page cache the page is fetched with a conditional request instead. An unchanged page yields no links,
+        so the run skips all downstream work for it, unless videos found on it earlier are still pending; then its
+        cached body is scanned again so they are retried.
+
         Args:
-        - url (str): The URL of the webpage to extract video links from. Defaults to config["YOUTUBE_URL"].
+        - url (str): The URL of the webpage to extract video links from. Defaults to the first channel in config["YOUTUBE_URL"].
         - max_links (int): The maximum number of links to extract. Defaults to config["MAX_VIDEOS_TO_DOWNLOAD"].
         - video_pattern (str): The regex pattern to match video links. Defaults to config["YOUTUBE_VIDEO_PATTERN"].
         - base_url (str): The base URL to prepend to relative video links. Defaults to config["YOUTUBE_BASE_URL"].
         - timeout (float): The timeout for the HTTP request in seconds. Defaults to config.get("REQUEST_TIMEOUT", 10).
+        - stream (bool): Scan the response while it downloads and stop early. Defaults to True.
+        - session (requests.Session): (Optional) Session whose connection pool is used for the request.
+        - page_cache (PageCache): (Optional) On-disk cache used for conditional requests.
 
         Returns:
         - list: A list of extracted video links, or an empty list if an error occurs.
         """
-        url = url or config["YOUTUBE_URL"]
+        url = url or config["YOUTUBE_URL"][0]
         max_links = max_links or config["MAX_VIDEOS_TO_DOWNLOAD"]
         video_pattern = video_pattern or config["YOUTUBE_VIDEO_PATTERN"]
         base_url = base_url or config["YOUTUBE_BASE_URL"]
@@ -44,13 +69,31 @@ class VideoLinkExtractor:
                 logger.error(f"Invalid MAX_VIDEOS_TO_DOWNLOAD value: {max_links}. It must be an integer.")
                 return []
 
+        import requests
+
+        pattern = _compile_pattern(video_pattern)
+        http = session or requests
+
         try:
-            response = requests.get(url, timeout=timeout)
-            response.raise_for_status()  
+            if page_cache:
+                body, changed = page_cache.fetch(url, session=session, timeout=timeout)
+                metrics.inc('cache_requests_total', cache='page', result='miss' if changed else 'hit')
+                if not changed and not page_cache.pending(url):
+                    logger.info(f"No changes on {url} and no pending videos. Skipping link extraction.")
+                    return []
+                video_ids = VideoLinkExtractor._scan_for_video_ids([body], pattern, max_links)
+                page_cache.set_pending(url, video_ids)  # Trimmed to the videos still missing after the run
+            elif stream:
+                with http.get(url, timeout=timeout, stream=True) as response:
+                    response.raise_for_status()
+                    video_ids = VideoLinkExtractor._scan_for_video_ids(
+                        VideoLinkExtractor._iter_text(response), pattern, max_links)
+            else:
+                response = http.get(url, timeout=timeout)
+                response.raise_for_status()  
+                video_ids = VideoLinkExtractor._scan_for_video_ids([response.text], pattern, max_links)
 
-            video_links = re.findall(video_pattern, response.text)
-            full_links = [f'{base_url}/watch?v={link}' for link in video_links]
-            return full_links[:max_links]
+            return [f'{base_url}/watch?v={video_id}' for video_id in video_ids]
 
         except requests.Timeout:
             logger.error(f"Request to {url} timed out after {timeout} seconds.")
@@ -59,6 +102,197 @@ class VideoLinkExtractor:
         
         return []
 
+    @staticmethod
+    def extract_video_entries_flat(url=None, max_links=None, base_url=None) -> List[Dict]:
+        """
+        Extract video entries from the /videos tab of a channel with yt-dlp's flat playlist extraction.
+
+        The tab is listed without extracting the videos themselves, so a single request returns the ID, title,
+        duration and approximate upload date of up to max_links videos.
+
+        Args:
+        - url (str): The channel URL; '/videos' is appended to a bare channel URL. Defaults to the first channel in config["YOUTUBE_URL"].
+        - max_links (int): The maximum number of entries to extract. Defaults to config["MAX_VIDEOS_TO_DOWNLOAD"].
+        - base_url (str): The base URL of the watch links. Defaults to config["YOUTUBE_BASE_URL"].
+
+        Returns:
+        - List[Dict]: Entries with the video 'url', 'id', 'title', 'duration' and 'upload_date' (YYYYMMDD, or None),
+          or an empty list if an error occurs.
+        """
+        url = VideoLinkExtractor._videos_tab_url(url or config["YOUTUBE_URL"][0])
+        max_links = int(max_links or config["MAX_VIDEOS_TO_DOWNLOAD"])
+        base_url = base_url or config["YOUTUBE_BASE_URL"]
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+            'extract_flat': 'in_playlist',
+            'playlistend': max_links,
+            # Parse the "3 days ago" labels of the tab into timestamps
+            'extractor_args': {'youtubetab': {'approximate_date': ['']}},
+        }
+
+        from yt_dlp.utils import DownloadError
+
+        try:
+            playlist = get_ydl('flat', ydl_opts).extract_info(url, download=False)
+        except DownloadError as e:
+            logger.error(f"Error listing the videos of {url}. Error: {e}")
+            return []
+
+        entries = []
+        for entry in (playlist or {}).get('entries') or []:
+            if len(entries) >= max_links:
+                break
+            if not entry or not entry.get('id'):
+                continue
+            timestamp = entry.get('timestamp')
+            entries.append({
+                'url': f'{base_url}/watch?v={entry["id"]}',
+                'id': entry['id'],
+                'title': entry.get('title'),
+                'duration': entry.get('duration'),
+                'upload_date': time.strftime('%Y%m%d', time.gmtime(timestamp)) if timestamp else None,
+            })
+        return entries
+
+    @staticmethod
+    def extract_video_links_from_channels(urls=None, max_links=None, max_workers=None, page_cache=None,
+                                          backend=None) -> List[Dict[str, str]]:
+        """
+        Extract video links from several channel pages concurrently and merge them into one download queue.
+
+        Args:
+        - urls (List[str]): The channel URLs. Defaults to config["YOUTUBE_URL"].
+        - max_links (int): The maximum number of links to extract per channel. Defaults to config["MAX_VIDEOS_TO_DOWNLOAD"].
+        - max_workers (int): The number of channels fetched at once. Defaults to config["MAX_DISCOVERY_WORKERS"].
+        - page_cache (PageCache): (Optional) On-disk cache used for conditional requests. Only used by the 'page' backend.
+        - backend (str): 'page' scans the channel page for links, 'flat' lists the channel with
+          extract_video_entries_flat. Defaults to config["DISCOVERY_BACKEND"].
+
+        Returns:
+        - List[Dict[str, str]]: Deduplicated entries with the video 'url' and the 'channel' it was found on,
+          in channel order. A video listed by several channels is kept for the first one only.
+          Entries of the 'flat' backend also carry the 'id', 'title', 'duration' and 'upload_date' of the video.
+        """
+        queue = []
+        for entries in VideoLinkExtractor.iter_channel_entries(urls, max_links, max_workers, page_cache, backend):
+            queue.extend(entries)
+        return queue
+
+    @staticmethod
+    def iter_channel_entries(urls=None, max_links=None, max_workers=None, page_cache=None,
+                             backend=None) -> Iterator[List[Dict[str, str]]]:
+        """
+        Fetch several channels concurrently and yield the new entries of each channel as soon as it is done.
+
+        Takes the same arguments as extract_video_links_from_channels.
+
+        Returns:
+        - Iterator[List[Dict[str, str]]]: The entries of each channel, in channel order, without the videos
+          already yielded for an earlier channel.
+        """
+        urls = urls or config["YOUTUBE_URL"]
+        max_workers = max(1, min(max_workers or config["MAX_DISCOVERY_WORKERS"], len(urls)))
+        backend = (backend or config["DISCOVERY_BACKEND"]).lower()
+        if backend not in ('page', 'flat'):
+            error_message = f"Unknown DISCOVERY_BACKEND '{backend}'. Use 'page' or 'flat'."
+            logger.error(error_message)
+            raise ValueError(error_message)
+
+        import requests
+
+        # One session for all channels, so connections to the same host are pooled and reused.
+        with requests.Session() as session:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+
+            def discover(channel_url: str) -> List[Dict]:
+                with metrics.timer('discovery_seconds', backend=backend):
+                    if backend == 'flat':
+                        return VideoLinkExtractor.extract_video_entries_flat(channel_url, max_links)
+                    links = VideoLinkExtractor.extract_video_links_from_page(
+                        channel_url, max_links, session=session, page_cache=page_cache)
+                    return [{'url': link} for link in links]
+
+            seen = set()
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='discovery') as executor:
+                for channel_url, entries in zip(urls, executor.map(discover, urls)):
+                    logger.info(f"Found {len(entries)} video links on {channel_url}.")
+                    new_entries = []
+                    for entry in entries:
+                        if entry['url'] not in seen:
+                            seen.add(entry['url'])
+                            new_entries.append(dict(entry, channel=channel_url))
+                    metrics.inc('videos_discovered_total', len(new_entries))
+                    yield new_entries
+
+    @staticmethod
+    def _videos_tab_url(url: str) -> str:
+        """Return the /videos tab of a bare channel URL, and any other URL unchanged."""
+        parts = [part for part in urlparse(url).path.split('/') if part]
+        if (len(parts) == 1 and parts[0].startswith('@')) or (len(parts) == 2 and parts[0] in ('channel', 'c', 'user')):
+            return url.rstrip('/') + '/videos'
+        return url
+
+    @staticmethod
+    def _iter_text(response: 'requests.Response') -> Iterator[str]:
+        """Yield the decoded text of a streamed response chunk by chunk.
+
+        Args:
+        - response (requests.Response): A response opened with stream=True.
+
+        Returns:
+        - Iterator[str]: The decoded chunks.
+        """
+        if response.encoding is None:
+            response.encoding = 'utf-8'
+        return response.iter_content(chunk_size=VideoLinkExtractor.CHUNK_SIZE, decode_unicode=True)
+
+    @staticmethod
+    def _scan_for_video_ids(chunks: Iterable[str], pattern: re.Pattern, max_links: int) -> List[str]:
+        """Collect up to max_links distinct video IDs, in order of appearance, from a sequence of text chunks.
+
+        Args:
+        - chunks (Iterable[str]): The page text, possibly split at arbitrary positions.
+        - pattern (re.Pattern): The compiled video pattern; its first group, if any, is the video ID.
+        - max_links (int): Stop once this many distinct IDs have been found.
+
+        Returns:
+        - List[str]: The distinct video IDs.
+        """
+        video_ids = []
+        seen = set()
+        buffer = ''
+
+        for chunk in chunks:
+            buffer += chunk
+            tail_start = max(len(buffer) - VideoLinkExtractor.OVERLAP, 0)
+            for match in pattern.finditer(buffer):
+                if match.end() == len(buffer):
+                    # The ID may continue in the next chunk, so rescan it from its start.
+                    tail_start = min(tail_start, match.start())
+                    break
+                tail_start = max(tail_start, match.end())
+                video_id = match.group(1) if pattern.groups else match.group(0)
+                if video_id not in seen:
+                    seen.add(video_id)
+                    video_ids.append(video_id)
+                    if len(video_ids) >= max_links:
+                        return video_ids
+            buffer = buffer[tail_start:]
+
+        # The last chunk has arrived, so a match touching the end of the buffer is complete.
+        for match in pattern.finditer(buffer):
+            video_id = match.group(1) if pattern.groups else match.group(0)
+            if video_id not in seen:
+                seen.add(video_id)
+                video_ids.append(video_id)
+                if len(video_ids) >= max_links:
+                    break
+        return video_ids
+
 # Usage example
 if __name__ == '__main__':
     links = VideoLinkExtractor.extract_video_links_from_page()
@@ -1,18 +1,21 @@
-# metadata_manager.py v1.3.3
+# metadata_manager.py v1.6.2
 
 # Description: Manages the storage, retrieval, and querying of video metadata.
 
-import json
 import os
 import logging
-from typing import Optional, Dict, Union
-from config_loader import load_config
-from youtube_metadata_checker import get_metadata_from_api, get_metadata_from_yt_dlp
+import threading
+from typing import Dict
+from metadata_store import create_metadata_store
+from youtube_metadata_checker import get_metadata_batch, get_metadata_from_yt_dlp
 
 logger = logging.getLogger('metadata_manager')
-config = load_config()
 
 class MetadataManager:
+    # Read-through cache shared by all managers of the same store: path -> (signature, metadata).
+    _caches: Dict[str, tuple] = {}
+    _cache_lock = threading.RLock()
+
     def __init__(self, config):
         """Initialize the MetadataManager with a configuration dictionary.
 
@@ -23,6 +26,8 @@ class MetadataManager:
         - None
         """
         self.metadata_file_path = config['METADATA_FILE']  
+        self.store = create_metadata_store(config)  # JSON file or SQLite, selected by METADATA_BACKEND
+        self.default_metadata_extractor = config['DEFAULT_METADATA_EXTRACTOR']
 
     def save_or_update_metadata(self, metadata):
         """Save or update the metadata of a video.
@@ -33,18 +38,44 @@ class MetadataManager:
         Returns:
         - None
         """
-        video_id = metadata.get('id')
-        if video_id:
-            all_metadata = self.get_all_metadata()
-            all_metadata[video_id] = metadata
-            # Get the directory of the metadata file
-            metadata_dir = os.path.dirname(self.metadata_file_path)
-            
-            # Check if the directory exists, if not create it
-            if not os.path.exists(metadata_dir):
-                os.makedirs(metadata_dir)
-            with open(self.metadata_file_path, 'w', encoding='utf-8') as file:
-                json.dump(all_metadata, file, ensure_ascii=False, indent=4)
+        if metadata.get('id'):
+            self.save_or_update_many([metadata])
+
+    def save_or_update_many(self, metadata_list):
+        """Save or update the metadata of several videos in a single write.
+
+        Args:
+        - metadata_list (List[Dict]): The metadata dictionaries to be saved or updated; each needs an 'id'.
+
+        Returns:
+        - None
+        """
+        if not metadata_list:
+            return
+        with self._cache_lock:
+            cached = self._caches.get(self.store.path)
+            cache_is_current = cached is not None and cached[0] == self.store.signature()
+            self.store.upsert_many(metadata_list)
+            if cache_is_current:
+                # Apply our own write to the cache instead of re-reading the whole archive.
+                for metadata in metadata_list:
+                    cached[1][metadata['id']] = metadata
+                self._caches[self.store.path] = (self.store.signature(), cached[1])
+            else:
+                self._caches.pop(self.store.path, None)
+
+    def _cached_metadata(self):
+        """Return the cached archive, reloading it only when the backing file's mtime or size changed.
+
+        Returns:
+        - Dict: All stored metadata keyed by video ID. Callers must not modify it.
+        """
+        with self._cache_lock:
+            signature = self.store.signature()  # Taken before reading, so a concurrent change forces a reload next time
+            cached = self._caches.get(self.store.path)
+            if cached is None or cached[0] != signature:
+                cached = self._caches[self.store.path] = (signature, self.store.get_all())
+            return cached[1]
 
     def get_all_metadata(self):
         """Retrieve all stored metadata.
@@ -52,10 +83,7 @@ class MetadataManager:
         Returns:
         - Dict: A dictionary containing all stored metadata.
         """
-        if os.path.exists(self.metadata_file_path):
-            with open(self.metadata_file_path, 'r', encoding='utf-8') as file:
-                return json.load(file)
-        return {}
+        return dict(self._cached_metadata())
 
     def query_metadata(self, video_id):
         """Query metadata of a specific video using its video ID.
@@ -66,8 +94,18 @@ class MetadataManager:
         Returns:
         - Optional[Dict]: The metadata of the specified video, or None if not found.
         """
-        all_metadata = self.get_all_metadata()
-        return all_metadata.get(video_id)
+        return self._cached_metadata().get(video_id)
+
+    def query_metadata_by_title(self, title):
+        """Query metadata of all videos with the given title.
+
+        Args:
+        - title (str): The video title to look up.
+
+        Returns:
+        - List[Dict]: The metadata of the matching videos, empty if none is found.
+        """
+        return self.store.find_by_title(title)
 
     def extract_and_save_additional_metadata(self, video_id):
         """Extract additional metadata using external functions and save or update it.
@@ -78,15 +116,34 @@ class MetadataManager:
         Returns:
         - None
         """
+        self.enrich_metadata([video_id])
+
+    def enrich_metadata(self, video_ids=None):
+        """Extract additional metadata for several videos and merge it into the stored metadata.
+
+        With the 'api' extractor all videos are fetched through batched YouTube Data API calls
+        (50 IDs per request); with yt-dlp they are extracted one by one.
+
+        Args:
+        - video_ids (List[str]): The video IDs to enrich. Defaults to every stored video.
+
+        Returns:
+        - int: The number of videos whose metadata was updated.
+        """
+        if video_ids is None:
+            video_ids = list(self._cached_metadata())
+
         if self.default_metadata_extractor == 'api':
-            additional_metadata = get_metadata_from_api(video_id)
+            additional_metadata = get_metadata_batch(video_ids)
         else:
-            additional_metadata = get_metadata_from_yt_dlp(video_id)
-        
-        if additional_metadata:
-            existing_metadata = self.query_metadata(video_id) or {}
-            updated_metadata = {**existing_metadata, **additional_metadata}
-            self.save_or_update_metadata(updated_metadata)
+            additional_metadata = {video_id: get_metadata_from_yt_dlp(video_id) for video_id in video_ids}
+
+        updated_metadata = [
+            {**(self.query_metadata(video_id) or {}), **metadata, 'id': video_id}
+            for video_id, metadata in additional_metadata.items() if metadata
+        ]
+        self.save_or_update_many(updated_metadata)
+        return len(updated_metadata)
     
     def get_metadata_file_path(self, video_id):
         """Generate the file path for a metadata file.
@@ -0,0 +1,210 @@
+# metadata_store.py v1.1.2
+
+# Description: Storage backends for video metadata, selected through the METADATA_BACKEND config key.
+
+import json
+import os
+import sqlite3
+import logging
+import threading
+from abc import ABC, abstractmethod
+from typing import Optional, Dict, List, Tuple
+
+from utils import write_atomic
+
+logger = logging.getLogger('metadata_store')
+
+class MetadataStore(ABC):
+    """Base class of the metadata storage backends. Metadata records are dicts keyed by their 'id'."""
+
+    path: str = ''
+
+    def signature(self) -> Tuple:
+        """Return the (mtime_ns, size) of the backing files, which changes whenever the stored data does."""
+        return _stat_signature(self.path)
+
+    @abstractmethod
+    def get(self, video_id: str) -> Optional[Dict]:
+        """Return the metadata of one video, or None if it is not stored."""
+
+    @abstractmethod
+    def get_all(self) -> Dict[str, Dict]:
+        """Return all stored metadata keyed by video ID."""
+
+    def find_by_title(self, title: str) -> List[Dict]:
+        """Return the metadata of all videos with the given title."""
+        return [metadata for metadata in self.get_all().values() if metadata.get('title') == title]
+
+    def upsert(self, metadata: Dict) -> None:
+        """Insert or replace the metadata of one video."""
+        self.upsert_many([metadata])
+
+    @abstractmethod
+    def upsert_many(self, metadata_list: List[Dict]) -> None:
+        """Insert or replace the metadata of several videos in one write."""
+
+class JsonMetadataStore(MetadataStore):
+    def __init__(self, file_path: str) -> None:
+        """Initialize the JSON backend, which keeps the whole archive in one file.
+
+        Args:
+        - file_path (str): Path of the metadata JSON file.
+
+        Returns:
+        - None
+        """
+        self.path = file_path
+        self._lock = threading.Lock()
+
+    def get(self, video_id: str) -> Optional[Dict]:
+        return self.get_all().get(video_id)
+
+    def get_all(self) -> Dict[str, Dict]:
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        return {}
+
+    def upsert_many(self, metadata_list: List[Dict]) -> None:
+        with self._lock:
+            all_metadata = self.get_all()
+            for metadata in metadata_list:
+                all_metadata[metadata['id']] = metadata
+            self._write(all_metadata)
+
+    def _write(self, all_metadata: Dict[str, Dict]) -> None:
+        """Write the archive to a temporary file and swap it in, so a crash never leaves a truncated file.
+
+        Args:
+        - all_metadata (Dict): The complete archive keyed by video ID.
+
+        Returns:
+        - None
+        """
+        write_atomic(self.path, json.dumps(all_metadata, ensure_ascii=False, indent=4))
+
+class SqliteMetadataStore(MetadataStore):
+    INDEXED_COLUMNS = ('title', 'published_at', 'downloaded_at')
+
+    def __init__(self, db_path: str, json_path: Optional[str] = None) -> None:
+        """Initialize the SQLite backend and migrate the JSON archive into it on first use.
+
+        Args:
+        - db_path (str): Path of the SQLite database file.
+        - json_path (Optional[str]): Path of an existing metadata JSON file to migrate once.
+
+        Returns:
+        - None
+        """
+        self.path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS videos ('
+                'id TEXT PRIMARY KEY, title TEXT, published_at TEXT, downloaded_at TEXT, data TEXT NOT NULL)'
+            )
+            for column in self.INDEXED_COLUMNS:
+                self._conn.execute(f'CREATE INDEX IF NOT EXISTS idx_videos_{column} ON videos ({column})')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value TEXT)')
+
+        if json_path:
+            self._migrate_from_json(json_path)
+
+    def _migrate_from_json(self, json_path: str) -> None:
+        """Copy every record of the JSON archive into the database in one transaction, only once.
+
+        The JSON file is left untouched, so switching METADATA_BACKEND back to json still works.
+
+        Args:
+        - json_path (str): Path of the metadata JSON file.
+
+        Returns:
+        - None
+        """
+        with self._lock:
+            migrated = self._conn.execute("SELECT value FROM store_info WHERE key = 'json_migrated'").fetchone()
+        if migrated or not os.path.exists(json_path):
+            return
+
+        with open(json_path, 'r', encoding='utf-8') as file:
+            all_metadata = json.load(file)
+
+        with self._lock, self._conn:
+            self._upsert_rows(all_metadata.values())
+            self._conn.execute("INSERT OR REPLACE INTO store_info (key, value) VALUES ('json_migrated', ?)", (json_path,))
+        logger.info(f"Migrated {len(all_metadata)} metadata records from {json_path} to {self.path}.")
+
+    def get(self, video_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute('SELECT data FROM videos WHERE id = ?', (video_id,)).fetchone()
+        return json.loads(row['data']) if row else None
+
+    def get_all(self) -> Dict[str, Dict]:
+        with self._lock:
+            rows = self._conn.execute('SELECT id, data FROM videos').fetchall()
+        return {row['id']: json.loads(row['data']) for row in rows}
+
+    def signature(self) -> Tuple:
+        # In WAL mode committed writes land in the -wal file until the next checkpoint.
+        return _stat_signature(self.path) + _stat_signature(self.path + '-wal')
+
+    def find_by_title(self, title: str) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute('SELECT data FROM videos WHERE title = ?', (title,)).fetchall()
+        return [json.loads(row['data']) for row in rows]
+
+    def upsert_many(self, metadata_list: List[Dict]) -> None:
+        with self._lock, self._conn:
+            self._upsert_rows(metadata_list)
+
+    def _upsert_rows(self, metadata_list) -> None:
+        """Insert or update rows; the caller holds the lock and the transaction."""
+        self._conn.executemany(
+            'INSERT INTO videos (id, title, published_at, downloaded_at, data) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET title = excluded.title, published_at = excluded.published_at, '
+            'downloaded_at = excluded.downloaded_at, data = excluded.data',
+            [
+                (
+                    metadata['id'],
+                    metadata.get('title'),
+                    metadata.get('published_at'),
+                    metadata.get('downloaded_at'),
+                    json.dumps(metadata, ensure_ascii=False),
+                )
+                for metadata in metadata_list
+            ],
+        )
+
+def _stat_signature(path: str) -> Tuple:
+    """Return (mtime_ns, size) of a file, or (None, None) if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return (None, None)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def create_metadata_store(config: Dict) -> MetadataStore:
+    """Create the metadata backend selected by METADATA_BACKEND ('json' or 'sqlite').
+
+    Args:
+    - config (Dict): The configuration dictionary.
+
+    Returns:
+    - MetadataStore: The configured storage backend.
+    """
+    backend = config.get('METADATA_BACKEND', 'json').lower()
+    if backend == 'json':
+        return JsonMetadataStore(config['METADATA_FILE'])
+    if backend == 'sqlite':
+        return SqliteMetadataStore(config['METADATA_DB_FILE'], json_path=config['METADATA_FILE'])
+
+    error_message = f"Unknown METADATA_BACKEND '{backend}'. Use 'json' or 'sqlite'."
+    logger.error(error_message)
+    raise ValueError(error_message)
@@ -0,0 +1,345 @@
+"""
+metrics.py v1.2.1
+
+This module collects the counters, gauges and histograms of a download run, such as the time spent in each stage,
+bytes downloaded and uploaded, retries and cache hits, and writes them after the run as a JSON run report and as
+a Prometheus textfile for the node_exporter textfile collector. The run report holds the values of the run; the
+textfile holds the counters and histograms of all runs, added up in a totals file, so they only ever increase.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from utils import write_atomic
+
+logger = logging.getLogger('metrics')
+
+PREFIX = 'cnnvideo'
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+SIZE_BUCKETS = (1 << 20, 4 << 20, 16 << 20, 64 << 20, 256 << 20, 1 << 30)
+LATENCY_BUCKETS = (600, 1800, 3600, 7200, 21600, 43200, 86400, 172800, 604800)  # Publish to download, in seconds
+
+# Help text of every metric, written to the Prometheus textfile
+DESCRIPTIONS = {
+    'run_seconds': "Wall time of download runs.",
+    'last_run_timestamp_seconds': "Unix time the last download run finished.",
+    'last_run_videos_downloaded': "Videos downloaded by the last download run.",
+    'discovery_seconds': "Time to list the new videos of a channel.",
+    'videos_discovered_total': "Videos found on the channel pages.",
+    'extract_seconds': "Time to extract the info of a video with yt-dlp.",
+    'cache_requests_total': "Cache lookups, by cache and result.",
+    'download_seconds': "Time to download a video, including post-processing.",
+    'download_bytes': "Size of the downloaded videos.",
+    'format_fallbacks_total': "Downloads retried in the next ranked format after the preferred one failed.",
+    'downloaded_bytes_total': "Bytes downloaded.",
+    'videos_downloaded_total': "Videos downloaded.",
+    'retries_total': "Retried attempts at extracting or downloading a video.",
+    'videos_failed_total': "Videos that failed after all retries.",
+    'publish_to_download_seconds': "Time from publishing a video to finishing its download.",
+    'metadata_write_seconds': "Time to store the metadata of a video.",
+    'upload_seconds': "Time to upload a video to Baidu Netdisk.",
+    'upload_slice_seconds': "Time to upload one slice to Baidu Netdisk.",
+    'uploaded_bytes_total': "Bytes of slices uploaded to Baidu Netdisk.",
+    'upload_slice_retries_total': "Upload slices sent again after failing.",
+    'uploads_total': "Uploads to Baidu Netdisk, by result.",
+    'smtp_send_seconds': "Time to send a notification email.",
+    'emails_total': "Notification emails, by result.",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * len(self.buckets)  # Observations in each bucket, not yet cumulative
+        self.count = 0
+        self.sum = 0.0
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = value if self.max is None else max(self.max, value)
+
+    def cumulative(self) -> Iterator[Tuple[str, int]]:
+        """Yield the upper bound and cumulative count of every bucket, ending with +Inf."""
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield _format_number(bound), total
+        yield '+Inf', self.count
+
+class Metrics:
+    def __init__(self) -> None:
+        """Initialize an empty registry. Every method is safe to call from several threads."""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all values, e.g. at the start of a run.
+
+        Returns:
+        - None
+        """
+        with self._lock:
+            self.started_at = time.time()
+            self._counters: Dict[Tuple[str, Labels], float] = {}
+            self._gauges: Dict[Tuple[str, Labels], float] = {}
+            self._histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Add value to a counter.
+
+        Args:
+        - name (str): The metric name, e.g. 'retries_total'.
+        - value (float): The amount added.
+        - labels: Label values that tell series of the same metric apart.
+
+        Returns:
+        - None
+        """
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        """Set a gauge to value.
+
+        Returns:
+        - None
+        """
+        with self._lock:
+            self._gauges[(name, _labels(labels))] = value
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = DURATION_BUCKETS, **labels: str) -> None:
+        """Record a value in a histogram.
+
+        Args:
+        - name (str): The metric name, e.g. 'download_seconds'.
+        - value (float): The observed value.
+        - buckets (Sequence[float]): Upper bounds of the buckets, used when the series is first observed.
+        - labels: Label values that tell series of the same metric apart.
+
+        Returns:
+        - None
+        """
+        key = (name, _labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str) -> Iterator[None]:
+        """Observe the duration of the enclosed block in seconds, also when it raises.
+
+        Args:
+        - name (str): The histogram name, e.g. 'extract_seconds'.
+        - labels: Label values that tell series of the same metric apart.
+
+        Returns:
+        - Iterator[None]: The timed context.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def snapshot(self) -> dict:
+        """Return all values as plain data, as written to the JSON run report.
+
+        Returns:
+        - dict: 'counters' and 'gauges' map each name to a list of {'labels', 'value'}; 'histograms' map each name
+          to a list of {'labels', 'count', 'sum', 'max', 'buckets'}, with cumulative bucket counts.
+        """
+        with self._lock:
+            report = {'counters': {}, 'gauges': {}, 'histograms': {}}
+            for kind, values in (('counters', self._counters), ('gauges', self._gauges)):
+                for (name, labels), value in sorted(values.items()):
+                    report[kind].setdefault(name, []).append({'labels': dict(labels), 'value': value})
+            for (name, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                report['histograms'].setdefault(name, []).append({
+                    'labels': dict(labels),
+                    'count': histogram.count,
+                    'sum': histogram.sum,
+                    'max': histogram.max,
+                    'buckets': dict(histogram.cumulative()),
+                })
+        return report
+
+    def write_json(self, path: str, **extra) -> None:
+        """Write the JSON run report.
+
+        Args:
+        - path (str): The report file, replaced atomically.
+        - extra: Additional top-level fields, e.g. the number of videos downloaded.
+
+        Returns:
+        - None
+        """
+        report = {
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            **extra,
+            **self.snapshot(),
+        }
+        write_atomic(path, json.dumps(report, indent=2, ensure_ascii=False))
+
+    def write_prometheus(self, path: str, report: Optional[dict] = None) -> None:
+        """Write all values in the Prometheus text exposition format.
+
+        Args:
+        - path (str): The .prom file, replaced atomically so the textfile collector never reads a partial file.
+        - report (dict): (Optional) Values in the format of snapshot() to write instead of those of this registry,
+          e.g. the totals of all runs.
+
+        Returns:
+        - None
+        """
+        report = report if report is not None else self.snapshot()
+        series = [(name, kind, entry) for kind, key in (('counter', 'counters'), ('gauge', 'gauges'),
+                                                        ('histogram', 'histograms'))
+                  for name, entries in report[key].items() for entry in entries]
+        lines = []
+        described = set()
+        for name, kind, entry in sorted(series, key=lambda item: (item[0], _labels(item[2]['labels']))):
+            metric = f'{PREFIX}_{name}'
+            labels = _labels(entry['labels'])
+            if name not in described:
+                described.add(name)
+                if name in DESCRIPTIONS:
+                    lines.append(f'# HELP {metric} {DESCRIPTIONS[name]}')
+                lines.append(f'# TYPE {metric} {kind}')
+            if kind != 'histogram':
+                lines.append(f'{metric}{_format_labels(labels)} {_format_number(entry["value"])}')
+                continue
+            for bound, count in entry['buckets'].items():
+                lines.append(f'{metric}_bucket{_format_labels(labels + (("le", bound),))} {count}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {_format_number(entry["sum"])}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {entry["count"]}')
+        write_atomic(path, '\n'.join(lines) + '\n')
+
+def add_totals(totals: dict, report: dict) -> dict:
+    """Add the counters and histograms of a run to the totals of earlier runs.
+
+    Args:
+    - totals (dict): The totals, in the format of Metrics.snapshot().
+    - report (dict): The values of the run, as returned by Metrics.snapshot().
+
+    Returns:
+    - dict: The new totals. Gauges set by the run replace those of the totals; the others are kept.
+    """
+    result = {'counters': {}, 'gauges': {**totals.get('gauges', {}), **report['gauges']}, 'histograms': {}}
+    for key in ('counters', 'histograms'):
+        for name in set(totals.get(key, {})) | set(report[key]):
+            merged = {_labels(entry['labels']): dict(entry) for entry in totals.get(key, {}).get(name, [])}
+            for entry in report[key].get(name, []):
+                labels = _labels(entry['labels'])
+                previous = merged.get(labels)
+                if previous is None:
+                    merged[labels] = dict(entry)
+                elif key == 'counters':
+                    previous['value'] += entry['value']
+                elif list(previous['buckets']) != list(entry['buckets']):
+                    logger.warning(f"Buckets of {name} changed; restarting its totals.")
+                    merged[labels] = dict(entry)
+                else:
+                    previous['count'] += entry['count']
+                    previous['sum'] += entry['sum']
+                    maxima = [value for value in (previous['max'], entry['max']) if value is not None]
+                    previous['max'] = max(maxima) if maxima else None
+                    previous['buckets'] = {bound: count + entry['buckets'][bound]
+                                           for bound, count in previous['buckets'].items()}
+            result[key][name] = [merged[labels] for labels in sorted(merged)]
+    return result
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + '}'
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+# The registry of this process, shared by all modules
+metrics = Metrics()
+
+_totals_lock = threading.Lock()  # Serializes updates of the totals file by the run and the notification queue
+
+def write_run_report(config, **extra) -> None:
+    """Write the metrics of the current run to the JSON run report, and the totals of all runs to the Prometheus textfile.
+
+    Args:
+    - config (Mapping): The configuration; METRICS_DIRECTORY holds run_report.json, the totals file totals.json and,
+      unless METRICS_TEXTFILE names another file, cnnvideo_timer.prom. An empty METRICS_DIRECTORY disables the reports.
+    - extra: Additional top-level fields of the JSON report.
+
+    Returns:
+    - None
+    """
+    directory = config["METRICS_DIRECTORY"]
+    if not directory:
+        return
+    try:
+        metrics.write_json(os.path.join(directory, 'run_report.json'), **extra)
+    except OSError as e:
+        # Losing a report must not fail the run that produced it.
+        logger.error(f"Failed to write the run report. Error: {e}")
+        return
+    textfile = add_to_totals(config, metrics)
+    logger.info(f"Wrote the run report to {directory} and the Prometheus textfile to {textfile}.")
+
+def add_to_totals(config, registry: Metrics) -> Optional[str]:
+    """Add the values of a registry to the totals of all runs and rewrite the Prometheus textfile from them.
+
+    Used by write_run_report, and by work that finishes after the run report, such as queued notification emails.
+
+    Args:
+    - config (Mapping): The configuration, as for write_run_report.
+    - registry (Metrics): The values to add; the caller resets it afterwards if it keeps collecting.
+
+    Returns:
+    - Optional[str]: The path of the Prometheus textfile, or None if the reports are disabled or failed to write.
+    """
+    directory = config["METRICS_DIRECTORY"]
+    if not directory:
+        return None
+    textfile = config["METRICS_TEXTFILE"] or os.path.join(directory, f'{PREFIX}_timer.prom')
+    totals_path = os.path.join(directory, 'totals.json')
+    try:
+        with _totals_lock:
+            totals = add_totals(_load_totals(totals_path), registry.snapshot())
+            write_atomic(totals_path, json.dumps(totals, ensure_ascii=False))
+            registry.write_prometheus(textfile, totals)
+    except OSError as e:
+        logger.error(f"Failed to update the metrics totals. Error: {e}")
+        return None
+    return textfile
+
+def _load_totals(path: str) -> dict:
+    """Return the totals of earlier runs, or empty totals if there are none or they cannot be read."""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError) as e:
+        logger.error(f"Ignoring unreadable metrics totals {path}. Counters restart from zero. Error: {e}")
+        return {}
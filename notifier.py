@@ -1,7 +1,9 @@
 """
-notifier.py v1.4.2
+notifier.py v1.7.1
 
 This script is tasked with sending notification emails. It constructs and sends emails to notify users about the availability of new videos or any errors that might have occurred during the video checking or downloading processes.
+Notifications submitted to the notification queue are delivered by a background thread, which coalesces the ones
+arriving within NOTIFY_DIGEST_WINDOW_SECONDS into one digest and reuses its authenticated SMTP connection.
 """
 
 import smtplib
@@ -9,30 +11,41 @@ import logging
 import os
 import argparse
 import sys
+import time
+import queue
+import atexit
 import datetime
+import threading
 from email.message import EmailMessage
 from time import sleep
 from random import randint
-from typing import List
-from config_loader import load_config
+from typing import List, Optional
+from config_loader import get_config
+from metrics import Metrics, metrics, add_to_totals
 
 # Set up a logger for this module
 logger = logging.getLogger('notifier')
 
+_CLOSE = object()  # Tells the notification queue worker to send what is pending and stop
+
 class Notifier:
 
-    def __init__(self) -> None:
+    def __init__(self, config=None, registry: Optional[Metrics] = None) -> None:
         """Initialize the Notifier with configuration loaded from the environment file.
 
         Args:
-        - None
+        - config (Mapping): (Optional) The configuration. Defaults to the shared configuration of config.env.
+        - registry (Metrics): (Optional) Where the send metrics are recorded. Defaults to the registry of the run.
         
         Returns:
         - None
         """
-        self.config = load_config()
+        self.config = config if config is not None else get_config()
         self.retry_count = self.config.get("EMAIL_RETRY_COUNT", 3)  # Load retry count from config or use default
         self.recipients = [email.strip() for email in self.config["SMTP_RECEIVER"].split(',')]
+        self.metrics = registry if registry is not None else metrics
+        self._server: Optional[smtplib.SMTP] = None  # Authenticated connection kept open between emails
+        self._lock = threading.Lock()
 
     def send_notification(self, downloaded_videos: List[str]) -> None:
         """Send an email notification with the titles and sizes of downloaded videos.
@@ -49,6 +62,9 @@ class Notifier:
         
         for video_path in downloaded_videos:
             video_filename = os.path.basename(video_path)
+            if not os.path.exists(video_path):  # Moved away while the digest was waiting
+                message_body += f"- {video_filename}\n"
+                continue
             video_size = os.path.getsize(video_path)  # Size in bytes
             video_size_mb = video_size / (1024 * 1024)  # Converting size to MB
             message_body += f"- {video_filename}, Size: {video_size_mb:.2f} MB\n"
@@ -75,19 +91,171 @@ class Notifier:
         retries = 0
         while retries < self.retry_count:
             try:
-                with smtplib.SMTP(self.config["SMTP_SERVER"], self.config["SMTP_PORT"]) as server:
-                    server.starttls()
-                    server.login(self.config["SMTP_USERNAME"], self.config["SMTP_PASSWORD"])
-                    server.send_message(message)
-                
+                with self.metrics.timer('smtp_send_seconds'), self._lock:
+                    self._connection().send_message(message)
+
+                self.metrics.inc('emails_total', result='sent')
                 logger.info(f"Notification email sent successfully to {', '.join(self.recipients)}!")
                 break  # Exit the loop if the email is sent successfully
-                
-            except smtplib.SMTPException as e:
+
+            except (smtplib.SMTPException, OSError) as e:
                 logger.error(f"Error sending notification email. Error: {e}. Retrying...")
+                self.metrics.inc('emails_total', result='error')
+                self.close()  # Reconnect on the next attempt
                 retries += 1
                 sleep(randint(1, 5))  # Random sleep before retrying
 
+    def _connection(self) -> smtplib.SMTP:
+        """Return the open SMTP connection, checking it is still alive, or connect, secure and log in again.
+
+        Returns:
+        - smtplib.SMTP: The authenticated connection. The caller holds self._lock.
+        """
+        if self._server is not None:
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except (smtplib.SMTPException, OSError):
+                pass  # Closed by the server while idle
+            self._discard()
+
+        server = smtplib.SMTP(self.config["SMTP_SERVER"], self.config["SMTP_PORT"])
+        try:
+            if self.config["SMTP_USE_TLS"]:
+                server.starttls()
+            server.login(self.config["SMTP_USERNAME"], self.config["SMTP_PASSWORD"])
+        except BaseException:
+            server.close()
+            raise
+        self._server = server
+        return server
+
+    def close(self) -> None:
+        """Log out and close the SMTP connection, if one is open.
+
+        Returns:
+        - None
+        """
+        with self._lock:
+            self._discard()
+
+    def _discard(self) -> None:
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+class NotificationQueue:
+
+    def __init__(self, notifier: Notifier, window: float, keepalive: float) -> None:
+        """Initialize a queue whose background thread delivers the submitted notifications as digests.
+
+        Args:
+        - notifier (Notifier): Sends the digests. Its send metrics are added to the metrics totals after each digest,
+          since the run report has usually been written by then.
+        - window (float): Seconds a digest waits after its first notification for more to coalesce; 0 sends
+          each notification as soon as the worker picks it up.
+        - keepalive (float): Seconds the SMTP connection stays open without emails before it is closed.
+
+        Returns:
+        - None
+        """
+        self.notifier = notifier
+        self.window = max(0.0, window)
+        self.keepalive = max(1.0, keepalive)
+        self._inbox: queue.Queue = queue.Queue()  # Unbounded, so submitting never waits on mail delivery
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, video_paths: List[str]) -> None:
+        """Queue a notification about downloaded videos and return at once.
+
+        Args:
+        - video_paths (List[str]): Paths of the downloaded videos.
+
+        Returns:
+        - None
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker, name='notifier', daemon=True)
+                self._thread.start()
+        self._inbox.put(list(video_paths))
+
+    def close(self, timeout: Optional[float] = 60) -> None:
+        """Send the pending digest now and stop the worker, e.g. when the process exits.
+
+        Args:
+        - timeout (float): (Optional) Seconds to wait for the delivery; None waits until it is done.
+
+        Returns:
+        - None
+        """
+        with self._lock:
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            return
+        self._inbox.put(_CLOSE)
+        thread.join(timeout)
+        if thread.is_alive():
+            logger.error(f"Notification queue did not finish sending within {timeout} seconds.")
+
+    def _worker(self) -> None:
+        pending: List[str] = []
+        deadline = 0.0
+        while True:
+            try:
+                item = self._inbox.get(timeout=max(0.0, deadline - time.monotonic()) if pending else self.keepalive)
+            except queue.Empty:
+                if pending:
+                    self._deliver(pending)
+                    pending = []
+                else:
+                    self.notifier.close()  # Idle for a while; servers drop idle connections anyway
+                continue
+            if item is _CLOSE:
+                if pending:
+                    self._deliver(pending)
+                self.notifier.close()
+                return
+            if not pending:
+                deadline = time.monotonic() + self.window
+            pending.extend(item)
+            if self.window == 0:
+                self._deliver(pending)
+                pending = []
+
+    def _deliver(self, video_paths: List[str]) -> None:
+        try:
+            self.notifier.send_notification(video_paths)
+        except Exception as e:
+            logger.error(f"Failed to send the notification for {len(video_paths)} video(s). Error: {e}")
+        add_to_totals(self.notifier.config, self.notifier.metrics)
+        self.notifier.metrics.reset()
+
+_notification_queue: Optional[NotificationQueue] = None
+_notification_queue_lock = threading.Lock()
+
+def get_notification_queue() -> NotificationQueue:
+    """Return the notification queue of this process, created on first use and flushed when the process exits.
+
+    Returns:
+    - NotificationQueue: The shared queue, so notifications of successive runs of a long-running scheduler
+      coalesce into the same digest.
+    """
+    global _notification_queue
+    with _notification_queue_lock:
+        if _notification_queue is None:
+            config = get_config()
+            notifier = Notifier(config, Metrics())  # Own registry, added to the totals after each digest
+            _notification_queue = NotificationQueue(notifier, config["NOTIFY_DIGEST_WINDOW_SECONDS"],
+                                                    config["SMTP_KEEPALIVE_SECONDS"])
+            atexit.register(_notification_queue.close)
+        return _notification_queue
+
 # Usage example
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Send a notification email with video filenames.")
@@ -101,4 +269,5 @@ if __name__ == "__main__":
         sys.exit(1)
     
     notifier = Notifier()
-    notifier.send_notification(args.filenames)
\ No newline at end of file
+    notifier.send_notification(args.filenames)
+    notifier.close()
\ No newline at end of file
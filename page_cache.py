@@ -0,0 +1,152 @@
+"""
+page_cache.py v1.1.1
+
+This module provides an on-disk HTTP cache for channel pages. It remembers the ETag, Last-Modified and body hash of
+each page, sends conditional requests, and reports whether the page changed since the previous run. It also keeps
+the IDs of the videos found on each page that are not downloaded yet, so an unchanged page is only skipped once
+nothing found on it is pending.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from utils import write_atomic
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger('page_cache')
+
+class PageCache:
+    def __init__(self, cache_directory: str, ttl: int) -> None:
+        """Initialize the page cache.
+
+        Args:
+        - cache_directory (str): Base cache directory; pages are stored in its 'pages' subdirectory.
+        - ttl (int): Seconds a cache entry is trusted. Older entries are refetched without validators.
+
+        Returns:
+        - None
+        """
+        self.directory = os.path.join(cache_directory, 'pages')
+        self.ttl = ttl
+
+    def fetch(self, url: str, session: Optional['requests.Session'] = None, timeout: float = 10) -> Tuple[str, bool]:
+        """Fetch a page with a conditional request.
+
+        Args:
+        - url (str): The page URL.
+        - session (requests.Session): (Optional) Session used for the request.
+        - timeout (float): The timeout for the HTTP request in seconds.
+
+        Returns:
+        - Tuple[str, bool]: The page body and whether it changed since the cached copy. The body is served
+          from disk on a 304 response.
+
+        Raises:
+        - requests.RequestException: If the request fails.
+        """
+        import requests
+
+        http = session or requests
+        entry = self._load_entry(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        response = http.get(url, headers=headers, timeout=timeout)
+        if response.status_code == 304 and entry:
+            logger.info(f"{url} not modified since {time.ctime(entry['fetched_at'])}.")
+            self._store(url, entry, None)  # Refresh fetched_at so the entry stays within its TTL
+            return self._read_body(url), False
+        response.raise_for_status()
+
+        body = response.text
+        body_hash = hashlib.sha256(body.encode('utf-8')).hexdigest()
+        changed = not entry or entry.get('body_sha256') != body_hash
+        if not changed:
+            logger.info(f"{url} body unchanged since {time.ctime(entry['fetched_at'])}.")
+
+        self._store(url, {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'body_sha256': body_hash,
+            'pending': entry.get('pending', []) if entry else [],
+        }, body if changed else None)
+        return body, changed
+
+    def pending(self, url: str) -> List[str]:
+        """Return the IDs of the videos found on a page that are not downloaded yet.
+
+        Args:
+        - url (str): The page URL.
+
+        Returns:
+        - List[str]: The pending video IDs; empty if none are stored.
+        """
+        entry = self._read_entry(url)
+        return entry.get('pending', []) if entry else []
+
+    def set_pending(self, url: str, video_ids: List[str]) -> None:
+        """Store the IDs of the videos found on a page that are not downloaded yet.
+
+        Args:
+        - url (str): The page URL; nothing is stored unless the page is cached.
+        - video_ids (List[str]): The pending video IDs.
+
+        Returns:
+        - None
+        """
+        entry = self._read_entry(url)
+        if entry is None:
+            return
+        entry['pending'] = list(video_ids)
+        write_atomic(self._entry_path(url), json.dumps(entry))  # Keeps fetched_at, unlike _store
+
+    def _load_entry(self, url: str) -> Optional[dict]:
+        """Return the cache entry of a page if it exists, is within its TTL, and still has its body."""
+        if not os.path.exists(self._body_path(url)):
+            return None
+        entry = self._read_entry(url)
+        if entry is None or time.time() - entry.get('fetched_at', 0) > self.ttl:
+            return None
+        return entry
+
+    def _read_entry(self, url: str) -> Optional[dict]:
+        entry_path = self._entry_path(url)
+        if not os.path.exists(entry_path):
+            return None
+        try:
+            with open(entry_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            logger.error(f"Ignoring unreadable page cache entry {entry_path}: {e}")
+            return None
+
+    def _read_body(self, url: str) -> str:
+        with open(self._body_path(url), 'r', encoding='utf-8') as file:
+            return file.read()
+
+    def _store(self, url: str, entry: dict, body: Optional[str]) -> None:
+        """Write the entry, and the body when given, through temporary files."""
+        os.makedirs(self.directory, exist_ok=True)
+        if body is not None:
+            write_atomic(self._body_path(url), body)
+        write_atomic(self._entry_path(url), json.dumps(dict(entry, fetched_at=time.time())))
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, url: str) -> str:
+        return os.path.join(self.directory, self._key(url) + '.json')
+
+    def _body_path(self, url: str) -> str:
+        return os.path.join(self.directory, self._key(url) + '.html')
@@ -0,0 +1,152 @@
+"""
+pipeline.py v1.0.1
+
+This module runs a download cycle as a pipeline of stages connected by bounded queues:
+discover -> extract -> download -> upload -> notify. Each stage has its own workers, so one video uploads while the
+next one downloads, and a full queue blocks the stage feeding it, which bounds the number of videos in memory and
+waiting on disk.
+"""
+
+import queue
+import logging
+import threading
+from typing import Any, Callable, Iterable, List, Optional
+
+from link_extractor import VideoLinkExtractor
+from metrics import metrics
+
+logger = logging.getLogger('pipeline')
+
+_DONE = object()  # Tells a stage worker that its upstream stage has finished
+
+class Pipeline:
+    def __init__(self, manager, config: dict, uploader=None, notify: Optional[Callable[[List[str]], None]] = None) -> None:
+        """Initialize the pipeline.
+
+        Args:
+        - manager (DownloaderManager): Extracts, downloads and records the videos.
+        - config (dict): The configuration dictionary.
+        - uploader (BaiduCloudUploader): (Optional) Uploads each downloaded video. Without it the upload stage is skipped.
+        - notify (Callable[[List[str]], None]): (Optional) Called with the paths of each batch of finished videos.
+
+        Returns:
+        - None
+        """
+        self.manager = manager
+        self.uploader = uploader
+        self.notify = notify
+        self.queue_size = max(1, config["PIPELINE_QUEUE_SIZE"])
+        self.extract_workers = max(1, config["MAX_CONCURRENT_EXTRACTIONS"])
+        self.download_workers = max(1, config["MAX_CONCURRENT_DOWNLOADS"])
+        self.upload_workers = max(1, config["MAX_CONCURRENT_UPLOADS"])
+        self.notify_batch_size = max(1, config["NOTIFY_BATCH_SIZE"])
+        self.downloaded_paths: List[str] = []
+        self._lock = threading.Lock()
+
+    def run(self, channels: List[str], max_links: int, page_cache=None) -> List[str]:
+        """Run one cycle, from discovering the channels to notifying about the finished videos.
+
+        Args:
+        - channels (List[str]): The channel URLs.
+        - max_links (int): The maximum number of videos taken from each channel.
+        - page_cache (PageCache): (Optional) On-disk cache used for conditional requests.
+
+        Returns:
+        - List[str]: The paths of the downloaded videos, in the order their downloads finished.
+        """
+        to_extract = queue.Queue(self.queue_size)
+        to_download = queue.Queue(self.queue_size)
+        to_upload = queue.Queue(self.queue_size) if self.uploader else None
+        to_notify = queue.Queue(self.queue_size)
+
+        stages = [
+            ('extract', self.extract_workers, to_extract, to_download, self._extract),
+            ('download', self.download_workers, to_download, to_upload or to_notify, self._download),
+        ]
+        if to_upload:
+            stages.append(('upload', self.upload_workers, to_upload, to_notify, self._upload))
+        stage_threads = [self._start_stage(*stage) for stage in stages]
+        notify_thread = threading.Thread(target=self._notify_worker, args=(to_notify,), name='notify', daemon=True)
+        notify_thread.start()
+
+        discovered = 0
+        try:
+            for entries in VideoLinkExtractor.iter_channel_entries(channels, max_links, page_cache=page_cache):
+                for entry in entries:
+                    to_extract.put(entry)  # Blocks while the extract stage is behind
+                    discovered += 1
+        finally:
+            # Shut the stages down in order, each one after its upstream stage has drained.
+            for (_, workers, inbox, _, _), threads in zip(stages, stage_threads):
+                for _ in range(workers):
+                    inbox.put(_DONE)
+                for thread in threads:
+                    thread.join()
+            to_notify.put(_DONE)
+            notify_thread.join()
+
+        logger.info(f"Pipeline finished: {len(self.downloaded_paths)} of {discovered} discovered videos downloaded.")
+        return self.downloaded_paths
+
+    def _start_stage(self, name: str, workers: int, inbox: queue.Queue, outbox: queue.Queue,
+                     handle: Callable[[Any], Iterable[Any]]) -> List[threading.Thread]:
+        """Start the workers of a stage. Each takes items from inbox and puts the results of handle into outbox."""
+        def work() -> None:
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    return
+                try:
+                    for result in handle(item):
+                        outbox.put(result)  # Blocks while the next stage is behind
+                except Exception as e:
+                    # One video failing must not stop the stage.
+                    logger.error(f"Pipeline stage '{name}' failed on {item}. Error: {e}", exc_info=True)
+
+        threads = [threading.Thread(target=work, name=f'{name}-{index}', daemon=True) for index in range(workers)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _extract(self, entry: dict) -> Iterable[tuple]:
+        video_info = self.manager.extract_video(entry)
+        if video_info is not None:
+            yield entry, video_info
+
+    def _download(self, item: tuple) -> Iterable[str]:
+        entry, video_info = item
+        video_path = self.manager.download_extracted(video_info, entry['url'], entry.get('channel'))
+        if video_path is not None:
+            with self._lock:
+                self.downloaded_paths.append(video_path)
+            yield video_path
+
+    def _upload(self, video_path: str) -> Iterable[str]:
+        try:
+            with metrics.timer('upload_seconds'):
+                response = self.uploader.upload_file(video_path)
+        except Exception as e:
+            # The video is still downloaded, so it is still reported.
+            logger.error(f"Failed to upload {video_path} to Baidu Netdisk. Error: {e}")
+            metrics.inc('uploads_total', result='failed')
+        else:
+            result = 'skipped' if response.get('skipped') else 'uploaded' if response.get('errno', -1) == 0 else 'failed'
+            metrics.inc('uploads_total', result=result)
+        yield video_path
+
+    def _notify_worker(self, inbox: queue.Queue) -> None:
+        """Send a notification for every NOTIFY_BATCH_SIZE finished videos, and one for the rest at the end."""
+        batch = []
+        while True:
+            item = inbox.get()
+            if item is not _DONE:
+                batch.append(item)
+            if batch and (item is _DONE or len(batch) >= self.notify_batch_size):
+                if self.notify:
+                    try:
+                        self.notify(batch)
+                    except Exception as e:
+                        logger.error(f"Failed to send the notification for {len(batch)} video(s). Error: {e}")
+                batch = []
+            if item is _DONE:
+                return
@@ -1,27 +1,28 @@
 """
-scheduler.py v1.3.0
+scheduler.py v1.7.2
 
 This script is responsible for scheduling and automating the video checking and downloading tasks. 
 It ensures that these tasks are executed at specified intervals, enabling the automatic and timely downloading of new videos.
 """
 
-import os
+import sys
 import argparse
 import logging
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import TYPE_CHECKING, List
 
-from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, JobEvent
-
-from utils import sanitize_filename  
 from video_downloader import main as video_downloader_main
-from notifier import Notifier
-from config_loader import load_config
+from notifier import get_notification_queue
+from config_loader import get_config
+from metadata_manager import MetadataManager
+from utils import startup_profile
+
+if TYPE_CHECKING:
+    from apscheduler.events import JobEvent
 
 # Setup logger
 logger = logging.getLogger('scheduler')
-config = load_config()
+config = get_config()
 
 def parse_arguments() -> argparse.Namespace:
     """Parse command-line arguments.
@@ -34,9 +35,11 @@ def parse_arguments() -> argparse.Namespace:
     """
     parser = argparse.ArgumentParser(description="Schedule the video downloader job.")
     parser.add_argument('--test', action='store_true', help="Run the job immediately for testing.")
+    parser.add_argument('--startup-profile', action='store_true',
+                        help="Report the import time of this script against the startup budget and exit.")
     return parser.parse_args()
 
-def listener(event: JobEvent) -> None:
+def listener(event: 'JobEvent') -> None:
     """Handles scheduler job events.
 
     Args:
@@ -50,8 +53,19 @@ def listener(event: JobEvent) -> None:
     else:
         logger.info("Scheduler job completed successfully.")
 
+def notify(video_paths: List[str]) -> None:
+    """Queues a notification email for a batch of downloaded videos, without waiting for it to be sent.
+
+    Args:
+    - video_paths (List[str]): Paths of the downloaded videos.
+
+    Returns:
+    - None
+    """
+    get_notification_queue().submit(video_paths)
+
 def job() -> None:
-    """Executes the video download job and sends notifications if videos were downloaded.
+    """Executes the video download job, which sends a notification for each batch of downloaded videos.
 
     Args:
     - None
@@ -62,16 +76,10 @@ def job() -> None:
     start_time = datetime.now()
     logger.info(f"Starting scheduled video download at {start_time}")
     
-    downloaded_titles = video_downloader_main()
-    
-    if downloaded_titles:
-        notifier = Notifier()
-        downloaded_video_paths = [os.path.join(config["VIDEO_DIRECTORY"], sanitize_filename(title) + config["VIDEO_EXTENSION"]) 
-                                 for title in downloaded_titles]
-        notifier.send_notification(downloaded_video_paths)
+    downloaded_filenames = video_downloader_main(notify=notify)
     
     end_time = datetime.now()
-    logger.info(f"Finished downloading {len(downloaded_titles)} videos at {end_time}")
+    logger.info(f"Finished downloading {len(downloaded_filenames)} videos at {end_time}")
 
 def next_run_time() -> datetime:
     """Determines the next run time based on the current time and configured run hours.
@@ -93,6 +101,39 @@ def next_run_time() -> datetime:
     else:
         return morning_run + timedelta(days=1)
 
+def create_trigger():
+    """Creates the trigger of the download job selected by SCHEDULE_MODE.
+
+    'fixed' runs every 12 hours from the next morning or evening run. 'adaptive' learns the publish hours
+    from the stored metadata and polls densely around them, using the fixed runs until enough videos are known.
+
+    Args:
+    - None
+
+    Returns:
+    - Tuple[Union[str, BaseTrigger], dict]: The trigger and its keyword arguments for add_job.
+    """
+    mode = config["SCHEDULE_MODE"].lower()
+    if mode == 'fixed':
+        return 'interval', {'hours': 12, 'next_run_time': next_run_time()}
+    if mode == 'adaptive':
+        from adaptive_trigger import AdaptiveTrigger, publish_times
+
+        metadata_manager = MetadataManager(config)  # One store connection for every evaluation of the trigger
+        trigger = AdaptiveTrigger(
+            load_samples=lambda: publish_times(metadata_manager.get_all_metadata().values()),
+            dense_interval=timedelta(minutes=config["ADAPTIVE_DENSE_INTERVAL_MINUTES"]),
+            sparse_interval=timedelta(minutes=config["ADAPTIVE_SPARSE_INTERVAL_MINUTES"]),
+            min_samples=config["ADAPTIVE_MIN_SAMPLES"],
+            fallback_times=[(config["MORNING_RUN_HOUR"], config["MORNING_RUN_MINUTE"]),
+                            (config["EVENING_RUN_HOUR"], config["EVENING_RUN_MINUTE"])],
+        )
+        return trigger, {}
+
+    error_message = f"Unknown SCHEDULE_MODE '{mode}'. Use 'fixed' or 'adaptive'."
+    logger.error(error_message)
+    raise ValueError(error_message)
+
 if __name__ == "__main__":
     """
     Usage:
@@ -106,14 +147,21 @@ if __name__ == "__main__":
     Without the --test flag, the scheduler will start and run the video download job at the specified intervals.
     """
     args = parse_arguments()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
+    if args.startup_profile:
+        sys.exit(0 if startup_profile('scheduler') else 1)
     if args.test:
         logger.info("Starting test run...")
         job()
         logger.info("Test run completed.")
     else:
+        from apscheduler.schedulers.blocking import BlockingScheduler
+        from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR
+
         scheduler = BlockingScheduler()
         scheduler.add_listener(listener, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
-        scheduler.add_job(job, 'interval', hours=12, next_run_time=next_run_time())
+        trigger, trigger_args = create_trigger()
+        scheduler.add_job(job, trigger, **trigger_args)
         logger.info("Scheduler started...")
         scheduler.start()
@@ -0,0 +1,76 @@
+"""
+state_db.py v1.0.0
+
+This module provides a small thread-safe wrapper around the SQLite database that keeps local state between runs,
+such as cached file hashes. Each user of the database declares its own tables.
+"""
+
+import os
+import sqlite3
+import logging
+import threading
+from typing import Any, List, Sequence
+
+logger = logging.getLogger('state_db')
+
+class StateDB:
+    def __init__(self, db_path: str, schema: str) -> None:
+        """Open the database and create the caller's tables if they do not exist.
+
+        Args:
+        - db_path (str): Path of the SQLite database file.
+        - schema (str): SQL script with CREATE TABLE/INDEX IF NOT EXISTS statements.
+
+        Returns:
+        - None
+        """
+        self.path = db_path
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(schema)
+
+    def query(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        """Run a SELECT statement and return all rows.
+
+        Args:
+        - sql (str): The statement.
+        - params (Sequence): The statement parameters.
+
+        Returns:
+        - List[sqlite3.Row]: The result rows.
+        """
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> int:
+        """Run a write statement in its own transaction.
+
+        Args:
+        - sql (str): The statement.
+        - params (Sequence): The statement parameters.
+
+        Returns:
+        - int: The number of affected rows.
+        """
+        with self._lock, self._conn:
+            return self._conn.execute(sql, params).rowcount
+
+    def execute_many(self, sql: str, params_list: Sequence[Sequence[Any]]) -> None:
+        """Run a write statement for each parameter set in one transaction.
+
+        Args:
+        - sql (str): The statement.
+        - params_list (Sequence[Sequence]): One parameter set per row.
+
+        Returns:
+        - None
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(sql, params_list)
@@ -0,0 +1,94 @@
+"""
+upload_index.py v1.0.0
+
+This module keeps a content-addressed index of files already uploaded to Baidu Netdisk, keyed by their block MD5 list,
+whole-file MD5 and size, so identical content is copied on the server or skipped instead of being uploaded again.
+"""
+
+import time
+import hashlib
+import logging
+from typing import List, Optional
+
+from state_db import StateDB
+
+logger = logging.getLogger('upload_index')
+
+class UploadIndex:
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS uploaded_content (
+            content_md5 TEXT NOT NULL,
+            block_list_md5 TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            remote_path TEXT NOT NULL,
+            uploaded_at REAL NOT NULL,
+            PRIMARY KEY (content_md5, block_list_md5, size, remote_path)
+        );
+    '''
+
+    def __init__(self, db_path: str) -> None:
+        """Initialize the upload index.
+
+        Args:
+        - db_path (str): Path of the local state database.
+
+        Returns:
+        - None
+        """
+        self.db = StateDB(db_path, self.SCHEMA)
+
+    @staticmethod
+    def _block_list_md5(block_list: List[str]) -> str:
+        """Digest the block MD5 list into one key column."""
+        return hashlib.md5(','.join(block_list).encode('ascii')).hexdigest()
+
+    def lookup(self, block_list: List[str], content_md5: str, size: int, preferred_path: Optional[str] = None) -> Optional[str]:
+        """Find a remote copy of the given content.
+
+        Args:
+        - block_list (List[str]): MD5 of each block of the file.
+        - content_md5 (str): MD5 of the whole file.
+        - size (int): Size of the file in bytes.
+        - preferred_path (str): (Optional) Remote path returned if the content is known there.
+
+        Returns:
+        - Optional[str]: A remote path holding identical content, or None if the content was never uploaded.
+        """
+        rows = self.db.query(
+            'SELECT remote_path FROM uploaded_content WHERE content_md5 = ? AND block_list_md5 = ? AND size = ? '
+            'ORDER BY uploaded_at DESC',
+            (content_md5, self._block_list_md5(block_list), size))
+        remote_paths = [row['remote_path'] for row in rows]
+        if preferred_path in remote_paths:
+            return preferred_path
+        return remote_paths[0] if remote_paths else None
+
+    def record(self, block_list: List[str], content_md5: str, size: int, remote_path: str) -> None:
+        """Remember that the given content now exists at a remote path.
+
+        Args:
+        - block_list (List[str]): MD5 of each block of the file.
+        - content_md5 (str): MD5 of the whole file.
+        - size (int): Size of the file in bytes.
+        - remote_path (str): Path of the file on Baidu Netdisk.
+
+        Returns:
+        - None
+        """
+        self.db.execute(
+            'INSERT OR REPLACE INTO uploaded_content (content_md5, block_list_md5, size, remote_path, uploaded_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (content_md5, self._block_list_md5(block_list), size, remote_path, time.time()))
+
+    def forget(self, remote_path: str) -> None:
+        """Drop a remote path that turned out not to hold the content anymore.
+
+        Args:
+        - remote_path (str): Path of the file on Baidu Netdisk.
+
+        Returns:
+        - None
+        """
+        removed = self.db.execute('DELETE FROM uploaded_content WHERE remote_path = ?', (remote_path,))
+        if removed:
+            logger.info(f"Removed {remote_path} from the upload index.")
@@ -0,0 +1,140 @@
+"""
+upload_journal.py v1.0.0
+
+This module records the progress of Baidu Netdisk uploads in the local state database, so an upload interrupted
+by a crash or restart resumes from the first missing slice instead of starting over.
+"""
+
+import os
+import json
+import time
+import logging
+from typing import List, Optional, Set, Tuple
+
+from state_db import StateDB
+
+logger = logging.getLogger('upload_journal')
+
+class UploadJournal:
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS upload_journal (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            remote_path TEXT NOT NULL,
+            upload_id TEXT NOT NULL,
+            block_size INTEGER NOT NULL,
+            block_list TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS upload_journal_parts (
+            path TEXT NOT NULL,
+            partseq INTEGER NOT NULL,
+            PRIMARY KEY (path, partseq)
+        );
+    '''
+
+    def __init__(self, db_path: str, ttl: int) -> None:
+        """Initialize the upload journal.
+
+        Args:
+        - db_path (str): Path of the local state database.
+        - ttl (int): Seconds after the last progress at which an entry is considered stale.
+
+        Returns:
+        - None
+        """
+        self.db = StateDB(db_path, self.SCHEMA)
+        self.ttl = ttl
+
+    def find(self, file_path: str, remote_path: str, block_size: int, block_list: List[str]) -> Optional[Tuple[str, Set[int]]]:
+        """Look up an unfinished upload of the same file content to the same remote path.
+
+        Args:
+        - file_path (str): Path to the local file.
+        - remote_path (str): Path of the file on Baidu Netdisk.
+        - block_size (int): Size of each slice.
+        - block_list (List[str]): MD5 of each slice of the file as it is now.
+
+        Returns:
+        - Optional[Tuple[str, Set[int]]]: The upload ID and the partseqs already uploaded, or None.
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        rows = self.db.query(
+            'SELECT upload_id, block_list, updated_at FROM upload_journal '
+            'WHERE path = ? AND size = ? AND mtime_ns = ? AND remote_path = ? AND block_size = ?',
+            (path, stat.st_size, stat.st_mtime_ns, remote_path, block_size))
+        if not rows or json.loads(rows[0]['block_list']) != block_list:
+            return None
+        if time.time() - rows[0]['updated_at'] > self.ttl:
+            self.finish(file_path)
+            return None
+
+        parts = self.db.query('SELECT partseq FROM upload_journal_parts WHERE path = ?', (path,))
+        return rows[0]['upload_id'], {row['partseq'] for row in parts}
+
+    def start(self, file_path: str, remote_path: str, upload_id: str, block_size: int, block_list: List[str]) -> None:
+        """Record a newly precreated upload, replacing any older entry for the file.
+
+        Args:
+        - file_path (str): Path to the local file.
+        - remote_path (str): Path of the file on Baidu Netdisk.
+        - upload_id (str): Upload ID received from the precreate step.
+        - block_size (int): Size of each slice.
+        - block_list (List[str]): MD5 of each slice.
+
+        Returns:
+        - None
+        """
+        path = os.path.abspath(file_path)
+        stat = os.stat(file_path)
+        self.db.execute('DELETE FROM upload_journal_parts WHERE path = ?', (path,))
+        self.db.execute(
+            'INSERT OR REPLACE INTO upload_journal '
+            '(path, size, mtime_ns, remote_path, upload_id, block_size, block_list, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (path, stat.st_size, stat.st_mtime_ns, remote_path, upload_id, block_size,
+             json.dumps(block_list), time.time()))
+
+    def mark_done(self, file_path: str, partseq: int) -> None:
+        """Record that one slice has been accepted by the server.
+
+        Args:
+        - file_path (str): Path to the local file.
+        - partseq (int): Sequence number of the uploaded slice.
+
+        Returns:
+        - None
+        """
+        path = os.path.abspath(file_path)
+        self.db.execute('INSERT OR IGNORE INTO upload_journal_parts (path, partseq) VALUES (?, ?)', (path, partseq))
+        self.db.execute('UPDATE upload_journal SET updated_at = ? WHERE path = ?', (time.time(), path))
+
+    def finish(self, file_path: str) -> None:
+        """Forget the upload of a file, after it was created or when it cannot be resumed.
+
+        Args:
+        - file_path (str): Path to the local file.
+
+        Returns:
+        - None
+        """
+        path = os.path.abspath(file_path)
+        self.db.execute('DELETE FROM upload_journal_parts WHERE path = ?', (path,))
+        self.db.execute('DELETE FROM upload_journal WHERE path = ?', (path,))
+
+    def expire_stale(self) -> int:
+        """Delete entries that made no progress within the TTL; the server discards such upload IDs anyway.
+
+        Returns:
+        - int: The number of expired entries.
+        """
+        cutoff = time.time() - self.ttl
+        self.db.execute(
+            'DELETE FROM upload_journal_parts WHERE path IN (SELECT path FROM upload_journal WHERE updated_at < ?)',
+            (cutoff,))
+        expired = self.db.execute('DELETE FROM upload_journal WHERE updated_at < ?', (cutoff,))
+        if expired:
+            logger.info(f"Expired {expired} stale upload journal entries.")
+        return expired
@@ -1,5 +1,5 @@
 """
-utils.py v1.4.1
+utils.py v1.6.0
 
 This module provides utility functions such as sanitizing filenames and setting up logging configurations.
 These functions are used across multiple modules in the project.
@@ -7,14 +7,23 @@ These functions are used across multiple modules in the project.
 
 import os
 import re
+import sys
+import time
 import logging
-from typing import NoReturn
-from config_loader import load_config
+import tempfile
+import subprocess
+from typing import NoReturn, Union
+from config_loader import get_config
 
-config = load_config()
+config = get_config()
 # Setting up a logger for this module
 logger = logging.getLogger(__name__) 
 
+# Import time allowed for a CLI entry point, checked by --startup-profile. Heavy dependencies
+# (yt_dlp, apscheduler, requests, tqdm) are imported on first use to stay within it.
+STARTUP_BUDGET_MS = 100
+HEAVY_MODULES = ('yt_dlp', 'apscheduler', 'requests', 'urllib3', 'tqdm')
+
 def sanitize_filename(filename: str) -> str:
     """Sanitize the filename by replacing special characters.
 
@@ -29,6 +38,28 @@ def sanitize_filename(filename: str) -> str:
     filename = re.sub(r'_+', '_', filename)
     return filename
 
+def write_atomic(path: str, data: Union[str, bytes]) -> None:
+    """Write a file through a temporary file in the same directory and swap it in, so a crash never leaves a
+    truncated file and readers never see a partial one.
+
+    Args:
+    - path (str): The file to replace. Its directory is created if it does not exist.
+    - data (Union[str, bytes]): The content; text is written as UTF-8.
+
+    Returns:
+    - None
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            file.write(data.encode('utf-8') if isinstance(data, str) else data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
 def setup_logging() -> NoReturn:
     """Setup the logging system with file and console handlers.
 
@@ -87,4 +118,43 @@ def create_directories() -> NoReturn:
             logger.info(f'Created directory: {download_path}')
         except OSError as e:
             logger.error(f"Error creating videos directory: {e}")
-            raise
\ No newline at end of file
+            raise
+
+def startup_profile(module_name: str, top: int = 10) -> bool:
+    """Measure the import time of an entry point in a fresh interpreter and print a report.
+
+    Args:
+    - module_name (str): The entry point module, e.g. 'scheduler'.
+    - top (int): Number of slowest imports listed.
+
+    Returns:
+    - bool: True if the module imports within STARTUP_BUDGET_MS.
+    """
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+                            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        print(f"Importing {module_name} failed:\n{result.stderr[-2000:]}")
+        return False
+
+    # Lines look like "import time:       self [us] |  cumulative | imported package"
+    imports = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| *(\S+)', line)
+        if match:
+            imports.append((int(match.group(2)) / 1000, match.group(3)))
+    import_ms = next((cumulative for cumulative, name in imports if name == module_name), 0.0)
+    heavy = sorted({name.split('.')[0] for _, name in imports if name.split('.')[0] in HEAVY_MODULES})
+
+    print(f"Startup profile of {module_name}: {import_ms:.1f} ms importing, "
+          f"{wall_ms:.1f} ms including interpreter start. Budget: {STARTUP_BUDGET_MS} ms importing.")
+    print("Slowest imports (cumulative):")
+    for cumulative, name in sorted(imports, reverse=True)[:top]:
+        print(f"  {cumulative:8.1f} ms  {name}")
+    print(f"Heavy dependencies imported at startup: {', '.join(heavy) or 'none'}")
+
+    within_budget = import_ms <= STARTUP_BUDGET_MS
+    if not within_budget:
+        print(f"{module_name} exceeds the startup budget by {import_ms - STARTUP_BUDGET_MS:.1f} ms.")
+    return within_budget
@@ -1,46 +1,65 @@
 """
-video_downloader.py version 1.9.1
+video_downloader.py version 1.22.3
 This module automatically downloads the latest CNN10 video using yt-dlp, ensuring titles are sanitized and saved to the designated directory.
 """
 
 # Standard library imports
 import os
+import time
+import shlex
+import shutil
 import logging
-
-# Third-party imports
-import yt_dlp.utils
-from yt_dlp import YoutubeDL
+import threading
+from datetime import datetime
 
 # Local application imports
-from config_loader import load_config
+from config_loader import get_config
 from downloader_checker import DownloaderManager
 from utils import setup_logging, create_directories, sanitize_filename
-from link_extractor import VideoLinkExtractor
+from page_cache import PageCache
+from hash_cache import HashCache
+from info_cache import InfoCache, video_id_from_url
+from format_selector import FormatSelector
+from ydl_pool import get_ydl
 from metadata_manager import MetadataManager  
-# from baidu_cloud_uploader import BaiduCloudUploader
+from pipeline import Pipeline
+from metrics import metrics, write_run_report, SIZE_BUCKETS
 
 
 # Load configuration file
-config = load_config()
+config = get_config()
 
 # Set up a logger for this module
 logger = logging.getLogger('video_downloader')
 
 class YTDownloader:
-    def __init__(self, output_directory=None):
+    def __init__(self, output_directory=None, config=None):
         """Initialize the YTDownloader with an output directory.
 
         Args:
         - output_directory : str : The directory where the downloaded videos will be saved.
+        - config : Mapping : (Optional) The configuration. Defaults to the shared configuration of config.env.
         """
+        self.config = config if config is not None else get_config()
         if not output_directory:
-            output_directory = config["DOWNLOAD_PATH"]
+            output_directory = self.config["DOWNLOAD_PATH"]
         self.output_directory = output_directory
+        self.hash_cache = HashCache(self.config["STATE_DB_FILE"])
+        self.info_cache = InfoCache(self.config["CACHE_DIRECTORY"], self.config["INFO_CACHE_TTL"],
+                                    self.config["STREAM_CACHE_TTL"], self.config["INFO_CACHE_MAX_SIZE_MB"])
+        self.format_selector = FormatSelector(self.config["STATE_DB_FILE"], self.config["MAX_RESOLUTION"],
+                                              self.config["MIN_RESOLUTION"], _codec_list(self.config["VIDEO_CODECS"]),
+                                              _codec_list(self.config["AUDIO_CODECS"]))
+        self._requested_format = threading.local()  # The format spec of the current download attempt of each thread
+        self._merge_available = None
 
         self.setup_youtube_downloader()
 
     def setup_youtube_downloader(self):
         """Setup the yt-dlp downloader with necessary options.
+
+        The download tuning options are taken from the configuration when the downloader is created,
+        so each run applies the current values and the rate limit of the hour it starts in.
     
         Args:
             self (YTDownloader): An instance of YTDownloader.
@@ -48,20 +67,107 @@ class YTDownloader:
         Returns:
             None
         """
-        yt_dlp.utils.std_headers['User-Agent'] = "Mozilla/5.0 ..."
         self.ydl_opts = {
-            # 'format': f'best[height<=720][ext={config["VIDEO_EXTENSION"]}]',  # Using VIDEO_EXTENSION from config
-            'format': '18', # 640*360 mp4 avc1.42001E, about 34MB
-            'outtmpl': os.path.join(self.output_directory, '%(title)s.%(ext)s'),
+            # 'auto' lets the format selector choose per video; any other value is a yt-dlp format spec used as is
+            'format': self._select_format if self.auto_format else self.config["VIDEO_FORMAT"],
+            'merge_output_format': self.config["VIDEO_EXTENSION"].lstrip('.'),
+            # sanitized_title is filled in by download_info, so one YoutubeDL serves every download
+            'outtmpl': os.path.join(self.output_directory, '%(sanitized_title)s.%(ext)s'),
             'quiet': True,
             'no_progress': True,
             'no_warnings': True,
-            'progress_hooks': [self.hook]
+            'http_headers': {'User-Agent': "Mozilla/5.0 ..."},
+            'progress_hooks': [self.hook],
+            **self.download_tuning_options(),
         }
-        self.ydl = YoutubeDL(self.ydl_opts)
+
+    @property
+    def auto_format(self):
+        """Whether the format of each video is chosen by the format selector (VIDEO_FORMAT=auto)."""
+        return self.config["VIDEO_FORMAT"].strip().lower() == 'auto'
+
+    @property
+    def merge_available(self):
+        """Whether ffmpeg is available to merge a video-only and an audio-only format."""
+        if self._merge_available is None:
+            from yt_dlp.postprocessor.ffmpeg import FFmpegMergerPP
+            self._merge_available = FFmpegMergerPP(self.ydl).available
+        return self._merge_available
+
+    def format_choices(self, info):
+        """Return the format specs a video is downloaded in, the preferred one first and then its fallbacks.
+
+        Args:
+        - info : dict : The extracted info dict of the video.
+
+        Returns:
+        - list : yt-dlp format specs, e.g. ['134+139', '18'].
+        """
+        if not self.auto_format:
+            return [self.config["VIDEO_FORMAT"]]
+        choices, stored = self.format_selector.choices(info, self.merge_available)
+        metrics.inc('cache_requests_total', cache='format', result='hit' if stored else 'miss')
+        return choices
+
+    def _select_format(self, ctx):
+        """yt-dlp format selector yielding the formats of the spec requested for the current download attempt."""
+        spec = getattr(self._requested_format, 'spec', None) or self.format_selector.fallback_format
+        yield from self.ydl.build_format_selector(spec)(ctx)
+
+    def download_tuning_options(self, now=None):
+        """Build the yt-dlp options for fragment concurrency, chunked requests, rate limiting and the external downloader.
+
+        Args:
+        - now : datetime : (Optional) The time the rate limit is chosen for. Defaults to the current local time.
+
+        Returns:
+        - dict : The yt-dlp options.
+        """
+        options = {'concurrent_fragment_downloads': self.config["CONCURRENT_FRAGMENTS"]}
+        if self.config["HTTP_CHUNK_SIZE"]:
+            options['http_chunk_size'] = self.config["HTTP_CHUNK_SIZE"]
+
+        rate_limit = self.config["RATE_LIMIT"]
+        throttle_hours = self.config["THROTTLE_HOURS"]
+        if throttle_hours and _hour_in_range((now or datetime.now()).hour, *throttle_hours):
+            rate_limit = self.config["THROTTLED_RATE_LIMIT"]
+            logger.info(f"Within the throttle hours {throttle_hours[0]}-{throttle_hours[1]}; "
+                        f"limiting downloads to {rate_limit or 'unlimited'} bytes/s.")
+        if rate_limit:
+            options['ratelimit'] = rate_limit
+
+        downloader = self.config["EXTERNAL_DOWNLOADER"]
+        if downloader == 'auto':
+            downloader = 'aria2c' if shutil.which('aria2c') else ''
+        elif downloader and not shutil.which(downloader):
+            logger.error(f"External downloader {downloader} is not installed. Using the built-in downloader.")
+            downloader = ''
+        if downloader:
+            options['external_downloader'] = {'default': downloader}
+            if self.config["EXTERNAL_DOWNLOADER_ARGS"]:
+                options['external_downloader_args'] = {downloader: shlex.split(self.config["EXTERNAL_DOWNLOADER_ARGS"])}
+        return options
+
+    @property
+    def ydl(self):
+        """The warm YoutubeDL instance of the current thread, shared by downloaders with the same output directory."""
+        return get_ydl(f'downloader:{self.output_directory}', self.ydl_opts, setup=self._setup_ydl)
+
+    def _setup_ydl(self, ydl):
+        """Register the post-processors on a newly created YoutubeDL instance.
+
+        Args:
+        - ydl : YoutubeDL : The new instance.
+
+        Returns:
+        - None
+        """
+        from hash_postprocessor import BlockHashPostProcessor  # Imports yt-dlp, needed from here on anyway
+
+        ydl.add_post_processor(BlockHashPostProcessor(self.hash_cache), when='after_move')
 
     def hook(self, d):
-        """Hook function to handle download progress.
+        """Hook function to handle download progress, counting the bytes of each finished file.
 
         Args:
         - d : dict : A dictionary containing information about the download process such as 'status', '_percent_str', '_total_bytes_str', and '_speed_str'.
@@ -70,12 +176,17 @@ class YTDownloader:
         - None
         """
         if d['status'] == 'downloading':
-            print(f"\r[download] {d['_percent_str']} of {d['_total_bytes_str']} at {d['_speed_str']}", end='', flush=True)
+            # External downloaders report fewer fields than the built-in one
+            print(f"\r[download] {d.get('_percent_str', '?')} of {d.get('_total_bytes_str', '?')} "
+                  f"at {d.get('_speed_str', '?')}", end='', flush=True)
         elif d['status'] == 'finished':
             print("")  # Print a new line to move the cursor to a new line after download is finished
+            metrics.inc('downloaded_bytes_total', d.get('total_bytes') or d.get('downloaded_bytes') or 0)
         
     def get_video_info(self, video_url):
         """Get video information without downloading the video.
+
+        The info dict is served from the on-disk info cache when the video was extracted within INFO_CACHE_TTL.
         
         Args:
         - video_url : str : The URL of the video to extract information from.
@@ -83,23 +194,87 @@ class YTDownloader:
         Returns:
         - dict : A dictionary containing various pieces of information about the video such as 'title', 'uploader', 'upload_date', etc.
         """
-        return self.ydl.extract_info(video_url, download=False)
+        video_id = video_id_from_url(video_url)
+        info = self.info_cache.get(video_id) if video_id else None
+        metrics.inc('cache_requests_total', cache='info', result='miss' if info is None else 'hit')
+        if info is None:
+            info = self.extract_video_info(video_url)
+        return info
+
+    def extract_video_info(self, video_url):
+        """Extract video information with yt-dlp, bypassing the info cache, and cache the result.
+
+        Args:
+        - video_url : str : The URL of the video to extract information from.
+
+        Returns:
+        - dict : The info dict returned by yt-dlp.
+        """
+        with metrics.timer('extract_seconds'):
+            info = self.ydl.extract_info(video_url, download=False)
+        self.info_cache.put(info)
+        return info
 
-    def download_video(self, video_url):
+    def download_video(self, video_url, info=None):
         """Download the video and save it to the specified directory.
         
         Args:
         - video_url : str : The URL of the video to be downloaded.
+        - info : dict : (Optional) The info dict already returned by get_video_info, which saves a second extraction.
         
         Returns:
-        - None : This method returns None. It downloads the video and saves it to the specified directory.
+        - str : The path of the downloaded file, or None if yt-dlp did not report it.
         """
-        info = self.ydl.extract_info(video_url, download=False)
-        clean_title = sanitize_filename(info['title'])
-        self.ydl_opts['outtmpl'] = os.path.join(self.output_directory, clean_title + '.%(ext)s')
-        self.ydl = YoutubeDL(self.ydl_opts)  # Re-initializing YoutubeDL to use the updated options
-        self.ydl.download([video_url])
-        # logger.info(f"Successfully downloaded {clean_title}.") 
+        if info is None:
+            info = self.get_video_info(video_url)
+        return self.download_info(info)
+
+    def download_info(self, info):
+        """Download a video from an info dict that has already been extracted.
+
+        The sanitized title is stored in the info dict and picked up by the output template,
+        so the existing YoutubeDL instance is reused instead of being rebuilt for each video.
+        An info dict from the cache whose stream URLs have expired is extracted again first.
+        The formats of format_choices are tried in order with the same info dict until one downloads.
+
+        Args:
+        - info : dict : The info dict returned by get_video_info.
+
+        Returns:
+        - str : The path of the downloaded file, or None if yt-dlp did not report it.
+        """
+        if 'formats' not in info:
+            info = self.extract_video_info(info['webpage_url'])
+        info = dict(info, sanitized_title=sanitize_filename(info['title']))
+        choices = self.format_choices(info)
+        for index, spec in enumerate(choices):
+            self._requested_format.spec = spec
+            try:
+                with metrics.timer('download_seconds'):
+                    result = self.ydl.process_ie_result(dict(info), download=True)
+                break
+            except Exception as e:
+                if index == len(choices) - 1:
+                    self.info_cache.drop_streams(info['id'])  # The stream URLs may have expired; a retry extracts fresh ones
+                    raise
+                logger.error(f"Downloading {info['id']} in format {spec} failed. Trying format {choices[index + 1]}. Error: {e}")
+                metrics.inc('format_fallbacks_total')
+            finally:
+                self._requested_format.spec = None
+        downloads = (result or {}).get('requested_downloads') or [{}]
+        file_path = downloads[0].get('filepath')
+        metrics.inc('videos_downloaded_total')
+        if file_path and os.path.exists(file_path):
+            metrics.observe('download_bytes', os.path.getsize(file_path), SIZE_BUCKETS)
+        return file_path
+
+def _codec_list(value):
+    """Split a comma-separated list of codec families such as 'avc1,vp9'; empty allows any codec."""
+    return [codec.strip() for codec in value.split(',') if codec.strip()]
+
+def _hour_in_range(hour, start, end):
+    """Check whether an hour of the day is in [start, end), a range that may wrap past midnight, e.g. 22-6."""
+    return start <= hour < end if start <= end else hour >= start or hour < end
 
 def display_metadata(last_downloaded_titles, config):
     """Display metadata of the downloaded videos.
@@ -111,9 +286,9 @@ def display_metadata(last_downloaded_titles, config):
     Returns:
     - None
     """
-    mm = MetadataManager(config)
+    mm = MetadataManager(config)  # Shares the in-memory metadata cache with the downloader's manager
     videos_metadata = mm.get_all_metadata()
-    for metadata in videos_metadata:
+    for metadata in videos_metadata.values():
         if metadata.get('title') in last_downloaded_titles:
             print(f"Title: {metadata.get('title', 'N/A')}")
             print(f"Uploader: {metadata.get('uploader', 'N/A')}")
@@ -124,10 +299,13 @@ def display_metadata(last_downloaded_titles, config):
             print(f"Description: {metadata.get('description', 'N/A')}")
             print("-"*50, "\n")
 
-def main():
+def main(notify=None):
     """
     Main function that orchestrates the video downloading process.
-    It extracts video links, downloads videos, and uploads them to Baidu Netdisk.
+    It extracts video links, downloads videos, and uploads them to Baidu Netdisk, as stages of one pipeline.
+
+    Args:
+    - notify : callable : (Optional) Called with the paths of each batch of downloaded videos.
     
     Returns:
     - list : A list containing the filenames of the videos that were successfully downloaded.
@@ -143,27 +321,40 @@ def main():
     setup_logging()
     create_directories()
     
-    # Extract video URLs
-    url = config["YOUTUBE_URL"]
-    logger.debug(f"Extracting video links from: {url}")
-    videos = VideoLinkExtractor.extract_video_links_from_page(url, config["MAX_VIDEOS_TO_DOWNLOAD"])
-    logger.info(f"Extracted {len(videos)} video links.")
+    config = get_config().snapshot()  # One consistent view for the whole run, even if config.env is edited meanwhile
+    metrics.reset()  # The run report covers this run; write_run_report adds it to the totals of the textfile
+    started = time.perf_counter()
+    channels = config["YOUTUBE_URL"]
+    logger.debug(f"Extracting video links from: {', '.join(channels)}")
+    page_cache = PageCache(config["CACHE_DIRECTORY"], config["PAGE_CACHE_TTL"]) if config["PAGE_CACHE_TTL"] > 0 else None
     
-    # Initialize downloader and checker
-    downloader = YTDownloader()
-    checker = DownloaderManager(videos, downloader, config)
+    # Initialize downloader and checker; the pipeline feeds the discovered videos to the checker
+    downloader = YTDownloader(config=config)
+    checker = DownloaderManager([], downloader, config)
+    # Baidu Netdisk upload runs as a pipeline stage when MAX_CONCURRENT_UPLOADS is greater than 0
+    uploader = None
+    if config["MAX_CONCURRENT_UPLOADS"] > 0:
+        from baidu_cloud_uploader import BaiduCloudUploader
+        uploader = BaiduCloudUploader(config=config)
+    pipeline = Pipeline(checker, config, uploader=uploader, notify=notify)
     logger.info("Starting the checking and downloading process.")
-    downloaded_filenames = checker.check_and_download()  
-    # Instantiate BaiduCloudUploader
-    # uploader = BaiduCloudUploader()  
-    # Temporarily disabling Baidu Netdisk upload feature, to be enhanced in future versions.
-    # if downloaded_filenames:
-        # for filename in downloaded_filenames:
-            # video_path = os.path.join(config["DOWNLOAD_PATH"], filename)
-            # uploader.upload_file(video_path) 
+    try:
+        downloaded_paths = pipeline.run(channels, config["MAX_VIDEOS_TO_DOWNLOAD"], page_cache=page_cache)
+    finally:
+        # Written after failed runs too, so the textfile shows when the last run ended and how far it got
+        metrics.observe('run_seconds', time.perf_counter() - started)
+        metrics.set('last_run_timestamp_seconds', time.time())
+        metrics.set('last_run_videos_downloaded', len(pipeline.downloaded_paths))
+        write_run_report(config, videos_downloaded=[os.path.basename(path) for path in pipeline.downloaded_paths])
+    if page_cache:
+        # Keep only the videos still missing from the library; a channel with none left is skipped while unchanged.
+        # A run that raises above leaves every video found pending, so the next run scans the pages again.
+        for channel in channels:
+            page_cache.set_pending(channel, [video_id for video_id in page_cache.pending(channel)
+                                             if video_id not in checker.library])
 
     logger.info("Script finished.")
-    return downloaded_filenames  # Modified to return downloaded filenames
+    return [os.path.basename(path) for path in downloaded_paths]  # Modified to return downloaded filenames
 
 if __name__ == "__main__":
     main()
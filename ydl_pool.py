@@ -0,0 +1,56 @@
+"""
+ydl_pool.py v1.0.2
+
+This module keeps warm yt-dlp instances, one per worker thread and option set, so extractors, cookies and the
+HTTP opener are initialized once per thread instead of once per call. All instances share a persistent cache
+directory, which lets yt-dlp reuse signature and player code across calls and runs.
+"""
+
+import logging
+import threading
+from typing import TYPE_CHECKING, Callable, Optional
+
+from config_loader import get_config
+
+if TYPE_CHECKING:
+    from yt_dlp import YoutubeDL
+
+logger = logging.getLogger('ydl_pool')
+
+config = get_config()
+
+_local = threading.local()
+
+def get_ydl(key: str, ydl_opts: dict, setup: Optional[Callable[['YoutubeDL'], None]] = None) -> 'YoutubeDL':
+    """Return the current thread's YoutubeDL instance for an option set, creating it on first use.
+
+    YoutubeDL instances are not thread-safe, so each thread gets its own. An instance is rebuilt when the
+    options registered under its key change.
+
+    Args:
+    - key (str): Name of the option set, e.g. 'metadata' or 'downloader:./videos'.
+    - ydl_opts (dict): The yt-dlp options. 'cachedir' defaults to config["YTDLP_CACHE_DIR"].
+    - setup (Callable): (Optional) Called once with each new instance, e.g. to add post-processors.
+
+    Returns:
+    - YoutubeDL: The pooled instance.
+    """
+    instances = getattr(_local, 'instances', None)
+    if instances is None:
+        instances = _local.instances = {}
+
+    ydl_opts = {'cachedir': config["YTDLP_CACHE_DIR"], **ydl_opts}
+    pooled = instances.get(key)
+    if pooled is not None and pooled[0] == ydl_opts:
+        return pooled[1]
+
+    from yt_dlp import YoutubeDL  # Imported on first use; it dominates the startup time otherwise
+
+    if pooled is not None:
+        pooled[1].close()
+    ydl = YoutubeDL(dict(ydl_opts))  # YoutubeDL normalizes its params in place; keep ours for comparison
+    if setup:
+        setup(ydl)
+    instances[key] = (ydl_opts, ydl)
+    logger.debug(f"Created yt-dlp instance '{key}' in thread {threading.current_thread().name}.")
+    return ydl
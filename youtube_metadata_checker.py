@@ -1,27 +1,41 @@
 """
-youtube_metadata_checker.py v1.0.2
+youtube_metadata_checker.py v1.4.1
 This module extracts and logs metadata from YouTube videos using both the YouTube Data API and yt-dlp.
 It's designed to work seamlessly with a list of video URLs obtained from a VideoLinkExtractor.
 """
-import requests
 import json
 import re
 import sys
 import logging
 import argparse
-import yt_dlp
+import threading
 from datetime import datetime
-from typing import Optional, Dict
-from config_loader import load_config
+from typing import TYPE_CHECKING, Optional, Dict, List
+from config_loader import get_config
 from link_extractor import VideoLinkExtractor
+from ydl_pool import get_ydl
+from info_cache import InfoCache
+from utils import startup_profile
 
 # Create a logger object
 logger = logging.getLogger('youtube_metadata_checker')
-logging.basicConfig(level=logging.INFO, handlers=[logging.StreamHandler()])
 
-config = load_config()
+config = get_config()
 
-API_KEY = config["YOUTUBE_API_KEY"]
+API_URL = "https://www.googleapis.com/youtube/v3/videos"
+API_PARTS = 'snippet,statistics,contentDetails'
+API_BATCH_SIZE = 50  # Maximum number of IDs accepted by one videos.list call
+# Field mask limiting responses to the values kept by _parse_api_item
+API_FIELDS = ('items(id,snippet(title,description,publishedAt,channelTitle,tags,categoryId),'
+              'statistics(viewCount,likeCount,dislikeCount,commentCount),contentDetails(duration))')
+
+if TYPE_CHECKING:
+    import requests
+
+_api_session: Optional['requests.Session'] = None
+_api_session_lock = threading.Lock()
+_info_cache: Optional[InfoCache] = None
+_info_cache_lock = threading.Lock()
 
 class CustomArgumentParser(argparse.ArgumentParser):
     def error(self, message):
@@ -29,6 +43,101 @@ class CustomArgumentParser(argparse.ArgumentParser):
         self.print_help()
         sys.exit(2)
 
+def _get_api_session() -> 'requests.Session':
+    """
+    Return the pooled HTTP session shared by all YouTube Data API calls.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _api_session
+    with _api_session_lock:
+        if _api_session is None:
+            import requests
+            _api_session = requests.Session()
+        return _api_session
+
+def _get_info_cache() -> InfoCache:
+    """
+    Return the info cache shared by all yt-dlp metadata lookups.
+
+    Returns:
+        InfoCache: The shared cache.
+    """
+    global _info_cache
+    with _info_cache_lock:
+        if _info_cache is None:
+            _info_cache = InfoCache(config["CACHE_DIRECTORY"], config["INFO_CACHE_TTL"],
+                                    config["STREAM_CACHE_TTL"], config["INFO_CACHE_MAX_SIZE_MB"])
+        return _info_cache
+
+def _parse_api_item(item: dict) -> dict:
+    """
+    Convert one item of a videos.list response to our metadata format.
+
+    Args:
+        item (dict): The API item.
+
+    Returns:
+        dict: The metadata of the video.
+    """
+    snippet = item.get('snippet', {})
+    statistics = item.get('statistics', {})
+    content_details = item.get('contentDetails', {})
+
+    return {
+        'title': snippet.get('title'),
+        'description': snippet.get('description'),
+        'published_at': snippet.get('publishedAt'),
+        'channel_title': snippet.get('channelTitle'),
+        'view_count': statistics.get('viewCount'),
+        'like_count': statistics.get('likeCount'),
+        'dislike_count': statistics.get('dislikeCount'),
+        'comment_count': statistics.get('commentCount'),
+        'tags': snippet.get('tags'),
+        'category_id': snippet.get('categoryId'),
+        'duration': content_details.get('duration'),
+    }
+
+def get_metadata_batch(video_ids: List[str]) -> Dict[str, dict]:
+    """
+    Get metadata for many videos from the YouTube Data API, 50 IDs per request.
+
+    Responses are trimmed with a field mask to the values we store, and all requests share one pooled session.
+
+    Args:
+        video_ids (List[str]): The IDs of the YouTube videos.
+
+    Returns:
+        Dict[str, dict]: The metadata of each video found, keyed by video ID. Videos in a failed request are missing.
+    """
+    import requests
+
+    video_ids = list(dict.fromkeys(video_ids))  # Deduplicate, keeping the order
+    session = _get_api_session()
+    metadata = {}
+
+    for start in range(0, len(video_ids), API_BATCH_SIZE):
+        chunk = video_ids[start:start + API_BATCH_SIZE]
+        params = {
+            'part': API_PARTS,
+            'id': ','.join(chunk),
+            'fields': API_FIELDS,
+            'key': config["YOUTUBE_API_KEY"],
+        }
+        try:
+            response = session.get(API_URL, params=params, timeout=config["REQUEST_TIMEOUT"])
+        except requests.RequestException as e:
+            logger.error(f"API request for {len(chunk)} video(s) failed. Error: {e}")
+            continue
+        if response.status_code != 200:
+            logger.error(f"API Error: {response.status_code}, {response.text}")
+            continue
+        for item in response.json().get('items', []):
+            metadata[item['id']] = _parse_api_item(item)
+
+    return metadata
+
 def get_metadata_from_api(video_id: str) -> dict:
     """
     Get metadata from YouTube Data API.
@@ -37,42 +146,13 @@ def get_metadata_from_api(video_id: str) -> dict:
         video_id (str): The ID of the YouTube video.
     
     Returns:
-        dict: The metadata obtained from the API.
+        dict: The metadata obtained from the API, or None if it could not be retrieved.
     """
-    part_parameters = 'snippet,statistics,contentDetails'
-    url = f"https://www.googleapis.com/youtube/v3/videos?part={part_parameters}&id={video_id}&key={API_KEY}"
-    
-    response = requests.get(url)
-    if response.status_code == 200:
-        data = response.json()
-        items = data.get('items', [])
-        if items:
-            item = items[0]
-            snippet = item.get('snippet', {})
-            statistics = item.get('statistics', {})
-            content_details = item.get('contentDetails', {})
-            
-            metadata_api = {
-                'title': snippet.get('title'),
-                'description': snippet.get('description'),
-                'published_at': snippet.get('publishedAt'),
-                'channel_title': snippet.get('channelTitle'),
-                'view_count': statistics.get('viewCount'),
-                'like_count': statistics.get('likeCount'),
-                'dislike_count': statistics.get('dislikeCount'),
-                'comment_count': statistics.get('commentCount'),
-                'tags': snippet.get('tags'),
-                'category_id': snippet.get('categoryId'),
-                'duration': content_details.get('duration'),
-            }
-            return metadata_api
-    else:
-        logger.error(f"API Error: {response.status_code}, {response.text}")
-        return None
+    return get_metadata_batch([video_id]).get(video_id)
 
 def get_metadata_from_yt_dlp(video_id: str) -> Optional[Dict]:
     """
-    Retrieve video metadata using the yt-dlp library.
+    Retrieve video metadata using the yt-dlp library, or from the info cache if the video was extracted recently.
 
     Parameters:
     - video_id : str : The ID of the YouTube video.
@@ -88,30 +168,34 @@ def get_metadata_from_yt_dlp(video_id: str) -> Optional[Dict]:
         'force_generic_extractor': True,
     }
     
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+    info_cache = _get_info_cache()
+    info_dict = info_cache.get(video_id)
+    if info_dict is None:
+        ydl = get_ydl('metadata', ydl_opts)  # Warm instance of this thread, not closed after the call
         info_dict = ydl.extract_info(f'https://www.youtube.com/watch?v={video_id}', download=False)
+        info_cache.put(info_dict)
+    
+    # Obtain more metadata
+    metadata_yt_dlp = {
+        'title': info_dict.get('title'),
+        'description': info_dict.get('description'),
+        'published_at': info_dict.get('upload_date'),
+        'channel_title': info_dict.get('uploader'),
+        'view_count': info_dict.get('view_count'),
+        'like_count': info_dict.get('like_count'),
+        'dislike_count': info_dict.get('dislike_count'),
+        'comment_count': info_dict.get('comment_count'),
+    }
+    upload_date = info_dict.get('upload_date')
+    if upload_date:
+        # Convert date string to datetime object
+        upload_datetime = datetime.strptime(upload_date, '%Y%m%d')
+        # Format datetime object to ISO 8601 string
+        metadata_yt_dlp['published_at'] = upload_datetime.isoformat()
+    else:
+        metadata_yt_dlp['published_at'] = None
         
-        # Obtain more metadata
-        metadata_yt_dlp = {
-            'title': info_dict.get('title'),
-            'description': info_dict.get('description'),
-            'published_at': info_dict.get('upload_date'),
-            'channel_title': info_dict.get('uploader'),
-            'view_count': info_dict.get('view_count'),
-            'like_count': info_dict.get('like_count'),
-            'dislike_count': info_dict.get('dislike_count'),
-            'comment_count': info_dict.get('comment_count'),
-        }
-        upload_date = info_dict.get('upload_date')
-        if upload_date:
-            # Convert date string to datetime object
-            upload_datetime = datetime.strptime(upload_date, '%Y%m%d')
-            # Format datetime object to ISO 8601 string
-            metadata_yt_dlp['published_at'] = upload_datetime.isoformat()
-        else:
-            metadata_yt_dlp['published_at'] = None
-            
-        return metadata_yt_dlp
+    return metadata_yt_dlp
 
 def extract_video_id(video_url: str) -> str:
     """
@@ -150,8 +234,13 @@ def main():
         usage='%(prog)s --url "<youtube-url>"'
     )
     parser.add_argument('--url', type=str, help="A specific YouTube video URL enclosed in double quotes.")
+    parser.add_argument('--startup-profile', action='store_true',
+                        help="Report the import time of this script against the startup budget and exit.")
     args = parser.parse_args()
-    
+    logging.basicConfig(level=logging.INFO, handlers=[logging.StreamHandler()])
+
+    if args.startup_profile:
+        sys.exit(0 if startup_profile('youtube_metadata_checker') else 1)
     if not args.url:
         parser.error("No URL provided. Please provide a YouTube video URL using the --url parameter.")
 